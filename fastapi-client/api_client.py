@@ -8,12 +8,16 @@ from pathlib import Path
 import logging
 import os
 import json
-import re
 import aiohttp
 import base64
 from urllib.parse import quote
 
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
+from git_mirror import GitMirror
+from push_coalescer import PushCoalescer
+from smee_client import SmeeRelay
+from webhook_ingress import WebhookIngress
+from rag_utils import extract_requirement_ids
 from pydantic import BaseModel
 import uvicorn
 
@@ -53,10 +57,18 @@ class WebhookPayload(BaseModel):
 # ==============================================================================
 class GitHubService:
     """GitHub API를 통해 데이터를 가져오는 서비스"""
-    
-    def __init__(self, token: Optional[str] = None):
+
+    GRAPHQL_URL = "https://api.github.com/graphql"
+    GRAPHQL_BATCH_SIZE = 50  # 쿼리 1회당 조회할 blob 수 (노드/복잡도 제한 고려)
+
+    def __init__(self, token: Optional[str] = None, content_backend: Optional[str] = None):
         self.token = token or os.getenv('GITHUB_TOKEN')
         self.session: Optional[aiohttp.ClientSession] = None
+        # 파일 내용 조회 방식 : 'rest' (파일당 1회 호출) | 'graphql' (여러 파일을 한 번에 조회)
+        self.content_backend = (content_backend or os.getenv('GITHUB_CONTENT_BACKEND', 'rest')).lower()
+        if self.content_backend == 'graphql' and not self.token:
+            logger.warning("GraphQL API requires GITHUB_TOKEN. Falling back to REST backend.")
+            self.content_backend = 'rest'
     
     async def __aenter__(self):
         headers = {}
@@ -123,6 +135,119 @@ class GitHubService:
                 logger.error(f"Failed to get large file content for {file_path}: {response.status}")
                 return None
 
+    async def get_files_content(self, repo_full_name: str, file_paths: List[str], ref: str = 'main') -> Dict[str, Optional[str]]:
+        """여러 파일의 내용을 설정된 backend 로 가져옵니다 (filename -> content)"""
+        if self.content_backend == 'graphql':
+            return await self.get_files_content_graphql(repo_full_name, file_paths, ref)
+
+        contents = {}
+        for file_path in file_paths:
+            contents[file_path] = await self.get_file_content(repo_full_name, file_path, ref)
+        return contents
+
+    async def get_files_content_graphql(self, repo_full_name: str, file_paths: List[str], ref: str) -> Dict[str, Optional[str]]:
+        """GraphQL 쿼리 한 번에 여러 blob 의 text 를 가져옵니다 (GRAPHQL_BATCH_SIZE 단위로 분할)"""
+        owner, name = repo_full_name.split('/', 1)
+        contents: Dict[str, Optional[str]] = {}
+
+        for start in range(0, len(file_paths), self.GRAPHQL_BATCH_SIZE):
+            chunk = file_paths[start:start + self.GRAPHQL_BATCH_SIZE]
+            query, variables = build_blob_batch_query(owner, name, ref, chunk)
+
+            try:
+                async with self.session.post(self.GRAPHQL_URL, json={"query": query, "variables": variables},
+                                             headers={'Authorization': f'bearer {self.token}'}) as response:
+                    if response.status != 200:
+                        raise RuntimeError(f"HTTP {response.status}")
+                    result = await response.json()
+                if result.get('errors'):
+                    logger.warning(f"GraphQL blob query returned errors: {result['errors']}")
+                repository = (result.get('data') or {}).get('repository')
+                if repository is None:
+                    raise RuntimeError("no repository data")
+            except (aiohttp.ClientError, RuntimeError) as e:
+                # 쿼리 자체가 실패한 chunk 는 REST 로 파일별 조회
+                logger.error(f"GraphQL blob query failed, falling back to REST: {e}")
+                for file_path in chunk:
+                    contents[file_path] = await self.get_file_content(repo_full_name, file_path, ref)
+                continue
+
+            for i, file_path in enumerate(chunk):
+                blob = repository.get(f"f{i}")
+                if not blob:
+                    logger.error(f"Failed to get file content for {file_path}: not found")
+                    contents[file_path] = None
+                elif blob.get('isBinary') or blob.get('isTruncated') or blob.get('text') is None:
+                    # 바이너리/잘린 blob 은 REST(raw) 경로로 보완
+                    contents[file_path] = None if blob.get('isBinary') else \
+                        await self.get_large_file_content(repo_full_name, file_path, ref)
+                else:
+                    contents[file_path] = blob['text']
+
+        return contents
+
+
+def build_blob_batch_query(owner: str, name: str, ref: str, file_paths: List[str]) -> tuple:
+    """`ref:path` 표현식마다 alias(f0, f1, ...) 를 붙인 GraphQL blob 조회 쿼리를 만듭니다"""
+    var_defs = ["$owner: String!", "$name: String!"]
+    fields = []
+    variables: Dict[str, Any] = {"owner": owner, "name": name}
+    for i, file_path in enumerate(file_paths):
+        var_defs.append(f"$e{i}: String!")
+        variables[f"e{i}"] = f"{ref}:{file_path}"
+        fields.append(f"f{i}: object(expression: $e{i}) {{ ... on Blob {{ text isBinary isTruncated byteSize }} }}")
+
+    query = (
+        f"query({', '.join(var_defs)}) {{\n"
+        f"  repository(owner: $owner, name: $name) {{\n    "
+        + "\n    ".join(fields)
+        + "\n  }\n}"
+    )
+    return query, variables
+
+
+class LocalMirrorService:
+    """로컬 bare mirror 에서 커밋 데이터를 읽는 서비스 (GitHubService 와 같은 인터페이스)"""
+
+    def __init__(self, mirror: Optional[GitMirror] = None):
+        self.mirror = mirror or GitMirror()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def get_commit_files(self, repo_full_name: str, commit_sha: str) -> List[Dict[str, Any]]:
+        """필요 시 증분 fetch 후, 커밋에서 변경된 파일 목록(patch 포함)을 가져옵니다"""
+        try:
+            await asyncio.to_thread(self.mirror.ensure_commit, repo_full_name, commit_sha)
+            return await asyncio.to_thread(self.mirror.get_changed_files, repo_full_name, commit_sha)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Failed to read commit {commit_sha[:8]} from mirror: {e.stderr.decode(errors='replace')}")
+            return []
+
+    async def get_file_content(self, repo_full_name: str, file_path: str, ref: str = 'main') -> Optional[str]:
+        """mirror 의 object store 에서 파일 내용을 읽습니다"""
+        return (await self.get_files_content(repo_full_name, [file_path], ref)).get(file_path)
+
+    async def get_files_content(self, repo_full_name: str, file_paths: List[str], ref: str = 'main') -> Dict[str, Optional[str]]:
+        """`git cat-file --batch` 한 번으로 여러 파일 내용을 읽습니다"""
+        return await asyncio.to_thread(self.mirror.read_blobs, repo_full_name, ref, file_paths)
+
+
+# 프로세스 전체에서 공유하는 mirror (repo 별 lock 이 인스턴스 단위라, push 마다 새로 만들면 동시 fetch 가 서로 ref lock 을 깨뜨림)
+commit_mirror: Optional[GitMirror] = None
+
+def create_commit_data_service():
+    """COMMIT_DATA_BACKEND 설정에 맞는 커밋 데이터 서비스를 생성합니다 ('github' | 'mirror')"""
+    global commit_mirror
+    if os.getenv('COMMIT_DATA_BACKEND', 'github').lower() == 'mirror':
+        if commit_mirror is None:
+            commit_mirror = GitMirror()
+        return LocalMirrorService(commit_mirror)
+    return GitHubService(os.getenv('GITHUB_TOKEN'))
+
 
 class LanguageDetector:
     """프로그래밍 언어를 감지하는 클래스"""
@@ -175,7 +300,7 @@ class MCPService:
             "message": commit_info.message,
             "sha": commit_info.sha,
             "files": files,
-            # "requirement_number": self._extract_requirement_number(commit_info.message)
+            "requirement_ids": extract_requirement_ids(commit_info.message)
         }
         
         logger.info(f"Sending analysis request for commit {commit_info.sha[:8]}")
@@ -197,67 +322,23 @@ class MCPService:
         except Exception as e:
             logger.error(f"Error sending commit analysis request: {str(e)}")
             return False
-    
-    def _extract_requirement_number(self, commit_message: str) -> Optional[str]:
-        """커밋 메시지에서 요구사항 번호를 추출합니다"""
-        patterns = [
-            r'REQ[-_]?(\d+)', r'요구사항[-_]?(\d+)', r'#(\d+)',
-            r'FEAT[-_]?(\d+)', r'REQUIREMENT[-_]?(\d+)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, commit_message, re.IGNORECASE)
-            if match:
-                return match.group(1)
-        return None
-
-
-class SmeeManager:
-    """Smee 클라이언트를 관리하는 클래스"""
-    
-    def __init__(self, smee_url: str, target_url: str = "http://localhost:8000/webhook"):
-        self.smee_url = smee_url
-        self.target_url = target_url
-        self.process: Optional[asyncio.subprocess.Process] = None
-    
-    async def start(self):
-        """Smee 클라이언트를 시작합니다"""
-        try:
-            cmd = ['npx', 'smee-client', '--url', self.smee_url, '--target', self.target_url]
-            self.process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            logger.info(f"Smee client started: {' '.join(cmd)}")
-        except FileNotFoundError:
-            logger.error("Failed to start smee client: 'npx' not found.")
-            logger.info("Please ensure Node.js and npx are installed and in your PATH.")
-        except Exception as e:
-            logger.error(f"Failed to start smee client: {str(e)}")
-    
-    async def stop(self):
-        """Smee 클라이언트를 중지합니다"""
-        if self.process and self.process.returncode is None:
-            self.process.terminate()
-            try:
-                await asyncio.wait_for(self.process.wait(), timeout=5.0)
-                logger.info("Smee client stopped")
-            except asyncio.TimeoutError:
-                self.process.kill()
-                logger.warning("Smee client forcefully killed")
 
 
 # ==============================================================================
 # FastAPI 라이프사이클 관리 (Lifespan Management)
 # ==============================================================================
-smee_manager: Optional[SmeeManager] = None
+smee_relay: Optional[SmeeRelay] = None
 github_service: Optional[GitHubService] = None
 mcp_service: Optional[MCPService] = None
+push_coalescer: Optional[PushCoalescer] = None
+webhook_ingress: Optional[WebhookIngress] = None
+relay_jobs: Optional[asyncio.Queue] = None
+relay_workers: List[asyncio.Task] = []
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """FastAPI lifespan 이벤트 핸들러"""
-    global smee_manager, github_service, mcp_service
+    global smee_relay, github_service, mcp_service, push_coalescer, webhook_ingress, relay_jobs, relay_workers
     
     logger.info("Starting up GitHub Webhook Server...")
     
@@ -265,25 +346,40 @@ async def lifespan(app: FastAPI):
     github_token = os.getenv('GITHUB_TOKEN')
     mcp_server_url = os.getenv('MCP_SERVER_URL', 'http://localhost:8001')
     
+    # 서명 검증 및 이벤트/repo/branch/경로 필터 (relay 시작 전에 준비)
+    webhook_ingress = WebhookIngress()
+    if not webhook_ingress.secret:
+        logger.warning("GITHUB_WEBHOOK_SECRET not set. Webhook signatures will not be verified.")
+
+    # relay 로 받은 push 는 크기 제한이 있는 작업 queue 에 넣고 고정된 수의 worker 가 처리 (가득 차면 relay 가 대기)
+    relay_jobs = asyncio.Queue(maxsize=int(os.getenv('WEBHOOK_QUEUE_SIZE', '100')))
+    worker_count = int(os.getenv('WEBHOOK_WORKERS') or os.getenv('MCP_POOL_SIZE', '4'))
+    relay_workers = [asyncio.create_task(process_relay_jobs()) for _ in range(max(worker_count, 1))]
+
     if smee_url:
-        smee_manager = SmeeManager(smee_url)
-        await smee_manager.start()
+        # smee 채널을 직접 구독하여 이벤트를 내부 처리로 바로 전달 (localhost 재전송 없음)
+        smee_relay = SmeeRelay(smee_url, relay_webhook_event)
+        await smee_relay.start()
     else:
-        logger.warning("SMEE_URL not set. Smee client will not be started.")
+        logger.warning("SMEE_URL not set. Smee relay will not be started.")
     
     if not github_token:
         logger.warning("GITHUB_TOKEN not set. GitHub API calls may be rate limited.")
     
     github_service = GitHubService(github_token)
     mcp_service = MCPService(mcp_server_url)
+    push_coalescer = PushCoalescer(process_coalesced_push)
     
     logger.info("GitHub Webhook Server started successfully")
     
     yield
     
     logger.info("Shutting down GitHub Webhook Server...")
-    if smee_manager:
-        await smee_manager.stop()
+    await push_coalescer.flush_all()
+    if smee_relay:
+        await smee_relay.stop()
+    for worker in relay_workers:
+        worker.cancel()
     logger.info("GitHub Webhook Server shut down")
 
 
@@ -314,29 +410,37 @@ async def health_check():
     """헬스 체크 엔드포인트"""
     return {
         "status": "healthy",
-        "smee_running": smee_manager is not None and smee_manager.process is not None,
+        "smee_running": smee_relay is not None and smee_relay.running,
+        "smee_relay": dict(smee_relay.stats, queued_jobs=relay_jobs.qsize(), workers=len(relay_workers)) if smee_relay else None,
         "github_service_ready": github_service is not None,
-        "mcp_service_ready": mcp_service is not None
+        "mcp_service_ready": mcp_service is not None,
+        "push_coalescing": push_coalescer.stats if push_coalescer else None,
+        "webhook_ingress": webhook_ingress.stats if webhook_ingress else None
     }
 
 @app.post("/webhook")
 async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
     """GitHub webhook을 처리하는 엔드포인트"""
     try:
-        payload = await request.json()
-        event_type = request.headers.get("X-GitHub-Event", "unknown")
-        logger.info(f"Received '{event_type}' event")
-
-        if event_type == "push" and ('commits' in payload or 'head_commit' in payload):
-            background_tasks.add_task(process_push_event, payload)
-            return {"status": "accepted", "message": "Push event received and processing started"}
-        
-        logger.info(f"Ignoring '{event_type}' event")
-        return {"status": "ignored", "reason": f"Not a push event: {event_type}"}
-        
-    except json.JSONDecodeError:
-        logger.error("Error decoding webhook payload")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        # 전체 JSON decode 전에 원본 byte 로 서명 검증 및 이벤트/repo/branch/경로 필터
+        decision = await webhook_ingress.check_request(request)
+        logger.info(f"Received '{request.headers.get('X-GitHub-Event', 'unknown')}' event "
+                    f"({decision.reason}, {decision.elapsed_us:.0f}us)")
+
+        if decision.status_code >= 400:
+            raise HTTPException(status_code=decision.status_code, detail=decision.reason)
+        if not decision.accepted:
+            return decision.response()
+
+        payload = decision.payload
+        if push_coalescer and push_coalescer.window > 0:
+            await push_coalescer.submit(payload)
+            return {"status": "accepted", "message": f"Push event queued for coalescing ({push_coalescer.window}s window)"}
+        background_tasks.add_task(process_push_event, payload)
+        return {"status": "accepted", "message": "Push event received and processing started"}
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -345,6 +449,28 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
 # ==============================================================================
 # 비즈니스 로직 (Business Logic)
 # ==============================================================================
+async def relay_webhook_event(headers: Dict[str, str], payload: dict):
+    """smee relay 로 받은 이벤트를 처리합니다 (handle_webhook 과 같은 규칙)"""
+    decision = webhook_ingress.check_payload(headers, payload)
+    logger.info(f"Relayed '{headers.get('x-github-event', 'unknown')}' event ({decision.reason})")
+    if not decision.accepted:
+        return
+    if push_coalescer and push_coalescer.window > 0:
+        await push_coalescer.submit(payload)
+        return
+    await relay_jobs.put(payload)
+
+async def process_relay_jobs():
+    """작업 queue 의 push 이벤트를 꺼내 처리합니다 (WEBHOOK_WORKERS 개가 동시에 실행)"""
+    while True:
+        payload = await relay_jobs.get()
+        try:
+            await process_push_event(payload)
+        except Exception as e:
+            logger.error(f"Error processing relayed push event: {str(e)}")
+        finally:
+            relay_jobs.task_done()
+
 async def process_push_event(payload: dict):
     """Push 이벤트를 처리하는 백그라운드 태스크"""
     try:
@@ -358,7 +484,7 @@ async def process_push_event(payload: dict):
             logger.info("No commits to process in push event")
             return
         
-        async with GitHubService(os.getenv('GITHUB_TOKEN')) as github:
+        async with create_commit_data_service() as github:
             for commit_data in commits:
                 await process_single_commit(github, repo_full_name, commit_data)
                 
@@ -368,7 +494,54 @@ async def process_push_event(payload: dict):
         logger.error(f"Error in process_push_event: {str(e)}")
 
 
-async def process_single_commit(github: GitHubService, repo_full_name: str, commit_data: dict):
+async def process_coalesced_push(merged: dict):
+    """window 동안 병합된 push 를 처리합니다 (각 파일의 최종 상태만 1회 분석)"""
+    try:
+        repo_full_name = merged['repository']['full_name']
+        head_commit = merged.get('head_commit') or {}
+        target_files = [filename for filename, status in merged['files'].items() if status != 'removed']
+
+        async with create_commit_data_service() as github:
+            if not target_files:
+                # payload 에 파일 목록이 없으면 마지막 커밋 기준으로 처리
+                if head_commit:
+                    await process_single_commit(github, repo_full_name, head_commit)
+                return
+
+            commit_sha = merged['after']
+            logger.info(f"Processing {merged['push_count']} coalesced push(es) up to {commit_sha[:8]} "
+                        f"({len(target_files)} files)")
+            contents = await github.get_files_content(repo_full_name, target_files, commit_sha)
+
+        file_contents = {filename: content for filename, content in contents.items() if content is not None}
+        if not file_contents:
+            logger.info(f"No processable file content found for coalesced push {commit_sha}")
+            return
+
+        author_info = head_commit.get('author', {})
+        commit_info = CommitInfo(
+            author=author_info.get('name', 'Unknown'),
+            email=author_info.get('email', 'unknown@email.com'),
+            message="\n".join(c.get('message', '') for c in merged['commits']),
+            sha=commit_sha,
+            changed_files=[{'filename': f, 'status': status} for f, status in merged['files'].items()],
+            file_contents=file_contents,
+            programming_languages={f: LanguageDetector.detect_language(f) for f in file_contents}
+        )
+
+        if mcp_service:
+            if not await mcp_service.send_commit_analysis_request(commit_info):
+                logger.error(f"Failed to send coalesced push {commit_sha[:8]} to MCP server")
+        else:
+            logger.error("MCP service not initialized, cannot send analysis request")
+
+    except KeyError as e:
+        logger.error(f"Missing key in coalesced push: {e}")
+    except Exception as e:
+        logger.error(f"Error in process_coalesced_push: {str(e)}")
+
+
+async def process_single_commit(github, repo_full_name: str, commit_data: dict):
     """단일 커밋을 처리합니다"""
     try:
         commit_sha = commit_data['id']
@@ -384,12 +557,11 @@ async def process_single_commit(github: GitHubService, repo_full_name: str, comm
         file_contents = {}
         programming_languages = {}
         
-        for file_info in changed_files_info:
-            if file_info.get('status') == 'removed':
-                continue
-            
-            filename = file_info['filename']
-            content = await github.get_file_content(repo_full_name, filename, commit_sha)
+        filenames = [f['filename'] for f in changed_files_info if f.get('status') != 'removed']
+        contents = await github.get_files_content(repo_full_name, filenames, commit_sha)
+
+        for filename in filenames:
+            content = contents.get(filename)
             if content is not None:
                 file_contents[filename] = content
                 programming_languages[filename] = LanguageDetector.detect_language(filename)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+
+class Subscriber:
+    """구독자 1명의 bounded queue (가득 차면 해당 구독자만 끊고, 재접속 시 Last-Event-ID 로 이어받음)"""
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class EventBus:
+    """분석 결과 이벤트를 SSE 구독자들에게 전달하는 클래스
+
+    - 최근 이벤트 history_size 개를 ring buffer 에 보관하여 재접속 구독자가 Last-Event-ID 이후부터 replay 할 수 있다.
+    - 구독자별 queue 는 queue_size 로 제한되고, 가득 차면(느린 클라이언트) 이벤트를 더 쌓지 않고 연결을 끊는다.
+      따라서 서버 메모리는 history_size + 구독자 수 × queue_size 이벤트를 넘지 않는다.
+    - 이벤트 id 는 프로세스 시작 시각(ms) 부터 매기므로, 서버 재시작 전의 Last-Event-ID 는 항상 현재 history 보다 작아
+      reset 을 받는다 (재시작 후 id 가 1 부터 다시 시작하면 새 이벤트가 중복으로 오인되어 버려짐).
+    """
+
+    def __init__(self, history_size: Optional[int] = None, queue_size: Optional[int] = None):
+        self.history_size = int(os.getenv("EVENT_HISTORY_SIZE", "1000")) if history_size is None else history_size
+        self.queue_size = int(os.getenv("EVENT_QUEUE_SIZE", "256")) if queue_size is None else queue_size
+        self._history: Deque[Tuple[int, str, str]] = deque(maxlen=self.history_size)  # (id, event, data json)
+        self._next_id = int(time.time() * 1000)
+        self._subscribers: Set[Subscriber] = set()
+        self.stats = {"published": 0, "delivered": 0, "subscribers": 0, "dropped_subscribers": 0, "replayed": 0}
+
+    def publish(self, event: str, data: Dict[str, Any]) -> int:
+        """이벤트를 기록하고 모든 구독자 queue 에 넣습니다 (대기하지 않음)"""
+        event_id = self._next_id
+        self._next_id += 1
+        item = (event_id, event, json.dumps(data, ensure_ascii=False, default=str))
+        self._history.append(item)
+        self.stats["published"] += 1
+
+        for sub in list(self._subscribers):
+            if sub.overflowed:
+                continue
+            try:
+                sub.queue.put_nowait(item)
+                self.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                # 느린 구독자 : 더 쌓지 않고 끊음 (클라이언트는 Last-Event-ID 로 재접속하여 replay)
+                sub.overflowed = True
+                self._subscribers.discard(sub)
+                self.stats["dropped_subscribers"] += 1
+                self.stats["subscribers"] = len(self._subscribers)
+        return event_id
+
+    def replay(self, last_event_id: int) -> Tuple[bool, list]:
+        """last_event_id 이후 이벤트를 반환합니다. (history 에서 이미 밀려난 이벤트가 있거나 이 프로세스가 발급하지 않은 id 면 첫 값이 False)"""
+        oldest = self._history[0][0] if self._history else self._next_id
+        complete = oldest <= last_event_id + 1 <= self._next_id
+        return complete, [item for item in self._history if item[0] > last_event_id]
+
+    async def subscribe(self, last_event_id: Optional[int] = None,
+                        heartbeat: float = 15.0) -> AsyncIterator[Tuple[Optional[int], str, str]]:
+        """(id, event, data) 를 차례로 내보냅니다. 이벤트가 없으면 heartbeat 초마다 (None, 'ping', '') 를 내보냅니다"""
+        sub = Subscriber(self.queue_size)
+        # queue 등록 후 history 를 읽어 replay 와 실시간 이벤트 사이에 빠지는 이벤트가 없도록 함 (중복은 id 로 제거)
+        self._subscribers.add(sub)
+        self.stats["subscribers"] = len(self._subscribers)
+        try:
+            sent = 0 if last_event_id is None else last_event_id
+            if last_event_id is not None and last_event_id >= self._next_id:
+                # 아직 발급하지 않은 id (이전 프로세스의 id) : 받은 적 없는 이벤트를 건너뛰지 않도록 실시간 스트림부터 다시 시작
+                yield None, "reset", json.dumps({"reason": "unknown event id", "oldest_id": self._next_id})
+                sent = self._next_id - 1
+            elif last_event_id is not None:
+                complete, missed = self.replay(last_event_id)
+                if not complete:
+                    yield None, "reset", json.dumps({"reason": "history truncated", "oldest_id": missed[0][0] if missed else self._next_id})
+                for item in missed:
+                    self.stats["replayed"] += 1
+                    sent = item[0]
+                    yield item
+            else:
+                sent = self._next_id - 1
+
+            while not sub.overflowed or not sub.queue.empty():
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None, "ping", ""
+                    continue
+                if item[0] <= sent:
+                    continue
+                sent = item[0]
+                yield item
+        finally:
+            self._subscribers.discard(sub)
+            self.stats["subscribers"] = len(self._subscribers)
+
+
+def format_sse(event_id: Optional[int], event: str, data: str) -> str:
+    if event == "ping":
+        return f": ping {int(time.time())}\n\n"
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in (data.splitlines() or [""]))
+    return "\n".join(lines) + "\n\n"
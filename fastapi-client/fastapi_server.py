@@ -1,42 +1,66 @@
 import json
+import os
 from urllib.parse import parse_qs
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 from contextlib import asynccontextmanager
 
 from mcp_client import MCPClient
-from smee_client import SmeeClientManager
+from smee_client import SmeeRelay
+from push_coalescer import PushCoalescer
 import time
 
-from rag_boot import load_or_build_vector_store
+from lexical_index import candidate_req_id
+from rag_boot import load_or_build_vector_store, load_lexical_index, retrieval_mode, llm
 from rag_feature import extract_features, build_query_from_features
-from rag_utils import search_requirements, judge_one
+from rag_utils import route_requirements_batch, ROUTING_STATS, make_judge_llm_call, JUDGE_STATS
+from rag_gate import judge_candidates, with_embedding_scale, GATE_STATS
+from prompt_packer import PACK_STATS
+from progress_store import ProgressStore
+from event_bus import EventBus, format_sse
+from webhook_ingress import WebhookIngress
 import asyncio
 
 
 mcp_client_instance: MCPClient = None
-smee_client_manager: SmeeClientManager = None
+smee_relay: SmeeRelay = None
+webhook_jobs: asyncio.Queue = None
+webhook_workers: list[asyncio.Task] = []
+push_coalescer: PushCoalescer = None
+webhook_ingress: WebhookIngress = None
+progress_store: ProgressStore = None
+
+# PM 대시보드용 분석 결과 이벤트 (GET /events, SSE)
+event_bus = EventBus()
 
 vector_store, _embeddings = load_or_build_vector_store()
+lexical_index = load_lexical_index() if retrieval_mode == "hybrid" else None
+# 판정 게이트 기준값 (거리 하한을 인덱스 벡터 norm 에 맞춰 비교)
+gate_thresholds = with_embedding_scale(vector_store)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
     print("FastAPI 시작 중...")
 
-    global mcp_client_instance, smee_client_manager
+    global mcp_client_instance, smee_relay, push_coalescer, progress_store, webhook_jobs, webhook_workers, webhook_ingress
 
-    # Smee 클라이언트 시작
-    print("Smee 클라이언트 시작 중...")
+    # webhook 수신 필터 (GITHUB_WEBHOOK_SECRET 서명 검증, WEBHOOK_EVENTS/REPOS/BRANCHES/PATHS 규칙)
+    webhook_ingress = WebhookIngress()
+    if not webhook_ingress.secret:
+        print("GITHUB_WEBHOOK_SECRET 미설정 : /webhook 서명 검증을 하지 않습니다.")
 
-    smee_url = "https://smee.io/JsEoOmxPUGyv3cl"
-    target_url = "http://127.0.0.1:8000/webhook"
-    smee_client_manager = SmeeClientManager(smee_url, target_url)
-    try:
-        await smee_client_manager.start()
-    except Exception as e:
-        print(f"Smee 클라이언트 시작 실패: {e}")
-    print("Smee 클라이언트 시작.")
+    # Smee 채널 구독 시작 (수신한 webhook 은 HTTP 재전송 없이 내부 작업 queue 로 바로 전달)
+    print("Smee relay 시작 중...")
+
+    webhook_jobs = asyncio.Queue(maxsize=int(os.getenv("WEBHOOK_QUEUE_SIZE", "100")))
+    # 작업 queue 를 여러 worker 가 나눠 처리 (기본값은 MCP 세션 pool 크기, 각 push 가 pool 의 세션을 하나씩 사용)
+    worker_count = int(os.getenv("WEBHOOK_WORKERS") or os.getenv("MCP_POOL_SIZE", "4"))
+    webhook_workers = [asyncio.create_task(process_webhook_jobs()) for _ in range(max(worker_count, 1))]
+    smee_url = os.getenv("SMEE_URL", "https://smee.io/JsEoOmxPUGyv3cl")
+    smee_relay = SmeeRelay(smee_url, enqueue_relayed_event)
+    await smee_relay.start()
 
     # MCP 서버 연결
     print("MCP 서버에 연결 시도...")
@@ -44,19 +68,30 @@ async def lifespan(app: FastAPI):
     mcp_client_instance = MCPClient()
 
     try:
-        await mcp_client_instance.connect_to_server("fastmcp-server/mcp_server.py")
+        # MCP_HTTP_URL 지정 시 상시 실행 중인 streamable HTTP 서버에, 아니면 stdio subprocess 로 세션 pool(MCP_POOL_SIZE) 연결
+        await mcp_client_instance.connect_to_server(os.getenv("MCP_HTTP_URL") or "fastmcp-server/mcp_server.py")
         print("MCP 서버 연결 성공.")
     except Exception as e:
         print(f"MCP 서버 연결 실패: {e}")
 
+    # 같은 repo/branch 의 연속 push 병합 (PUSH_COALESCE_WINDOW 초, 0 이면 비활성)
+    push_coalescer = PushCoalescer(analyze_coalesced_push)
+
+    # 요구사항 진척률 저장소 (PROGRESS_DB_PATH, SQLite)
+    progress_store = ProgressStore()
+
     print("FastAPI 시작.")
 
     # FastAPI 종료 시 MCP 클라이언트 리소스 정리
     yield
     print("FastAPI 종료 중, MCP 클라이언트 정리...")
+    await push_coalescer.flush_all()
     await mcp_client_instance.cleanup()
-    if smee_client_manager:
-        await smee_client_manager.stop()
+    progress_store.close()
+    if smee_relay:
+        await smee_relay.stop()
+    for worker in webhook_workers:
+        worker.cancel()
     print("MCP 클라이언트 정리 완료.")
 
 app = FastAPI(lifespan=lifespan)
@@ -67,70 +102,122 @@ async def root():
 
 @app.get("/tools")
 async def get_mcp_tools():
-    if not mcp_client_instance or not mcp_client_instance.session:
+    if not mcp_client_instance or not mcp_client_instance.connected:
         return {"error": "MCP 클라이언트가 연결되지 않았습니다."}, 500
 
     try:
-        response = await mcp_client_instance.session.list_tools()
+        response = await mcp_client_instance.list_tools()
         tool_names = [tool.name for tool in response.tools]
         return {"tools": tool_names}
     except Exception as e:
         return {"error": f"MCP 도구 목록 조회 중 오류 발생: {e}"}, 500
 
+@app.get("/stats")
+async def get_stats():
+    return {
+        "push_coalescing": push_coalescer.stats if push_coalescer else None,
+        "requirement_routing": ROUTING_STATS,
+        "judge_gate": GATE_STATS,
+        "judge_llm": JUDGE_STATS,
+        "judge_prompts": PACK_STATS,
+        "events": event_bus.stats,
+        "mcp_pool": mcp_client_instance.pool.stats if mcp_client_instance and mcp_client_instance.pool else None,
+        "webhook_ingress": webhook_ingress.stats if webhook_ingress else None,
+        "smee_relay": dict(smee_relay.stats, queued_jobs=webhook_jobs.qsize(), workers=len(webhook_workers)) if smee_relay else None,
+    }
+
+def _resolve_repo(repo: str | None) -> str:
+    # repo 미지정 시 기록된 repo 가 하나뿐이면 그 repo 사용
+    if repo:
+        return repo
+    repos = progress_store.list_repos()
+    if len(repos) != 1:
+        raise HTTPException(status_code=400, detail=f"repo 파라미터가 필요합니다. (기록된 repo: {repos})")
+    return repos[0]
+
+@app.get("/progress")
+async def get_requirement_progress(repo: str | None = None):
+    repo = _resolve_repo(repo)
+    return {"repo": repo, "requirements": progress_store.list_progress(repo)}
+
+@app.get("/progress/{req_id}")
+async def get_requirement_progress_detail(req_id: str, repo: str | None = None, limit: int = 20):
+    repo = _resolve_repo(repo)
+    progress = progress_store.get_progress(repo, req_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"{req_id} 의 진척 기록이 없습니다.")
+    return {"repo": repo, **progress, "history": progress_store.get_history(repo, req_id, limit)}
+
+@app.get("/commits/{commit_sha}/verdicts")
+async def get_commit_verdicts(commit_sha: str, repo: str | None = None):
+    repo = _resolve_repo(repo)
+    return {"repo": repo, "sha": commit_sha, "verdicts": progress_store.get_commit_verdicts(repo, commit_sha)}
+
+@app.get("/events")
+async def stream_events(request: Request, offset: int | None = None):
+    """분석 단계별 결과를 SSE 로 전달합니다. 재접속 시 Last-Event-ID 헤더(또는 offset) 이후 이벤트부터 replay"""
+    last_event_id = request.headers.get("last-event-id")
+    start = int(last_event_id) if last_event_id and last_event_id.isdigit() else offset
+
+    async def stream():
+        yield "retry: 3000\n\n"
+        async for event_id, event, data in event_bus.subscribe(start):
+            if await request.is_disconnected():
+                break
+            yield format_sse(event_id, event, data)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/webhook")
 async def github_webhook(request: Request):
-    data = await request.json()
-    
+    # 전체 JSON decode 전에 원본 byte 로 서명 검증과 이벤트/repo/branch/경로 필터 수행
+    decision = await webhook_ingress.check_request(request)
+    if not decision.accepted:
+        print(f"Webhook 무시 ({decision.status_code}): {decision.reason}")
+        return JSONResponse(status_code=decision.status_code, content=decision.response())
+    return await process_webhook(decision.payload)
+
+
+async def enqueue_relayed_event(headers: dict, payload: dict):
+    """smee relay 로 받은 이벤트를 작업 queue 에 넣습니다 (queue 가 가득 차면 빌 때까지 대기)"""
+    decision = webhook_ingress.check_payload(headers, payload)
+    if not decision.accepted:
+        print(f"Smee relay 이벤트 무시: {decision.reason}")
+        return
+    await webhook_jobs.put(payload)
+
+
+async def process_webhook_jobs():
+    """작업 queue 의 push 이벤트를 꺼내 처리합니다 (WEBHOOK_WORKERS 개가 동시에 실행)"""
+    while True:
+        payload = await webhook_jobs.get()
+        try:
+            await process_webhook(payload)
+        except Exception as e:
+            print(f"Webhook 작업 처리 중 오류 발생: {e}")
+        finally:
+            webhook_jobs.task_done()
+
+
+async def process_webhook(data: dict):
     try:
+        if push_coalescer and push_coalescer.window > 0 and 'ref' in data:
+            # 연속 push 는 window 동안 모았다가 최종 상태만 분석
+            await push_coalescer.submit(data)
+            return {"status": "accepted", "message": f"Push 이벤트 병합 대기 중 ({push_coalescer.window}초)"}
+
         # 코드 변경 내역 불러오기.
         repo_full_name = data['repository']['full_name']
         commit_sha = data['head_commit']['id']
         print(f"Webhook 수신: {repo_full_name}, Commit SHA: {commit_sha}")
 
-        query = f"GitHub 리포지토리 '{repo_full_name}'의 커밋 '{commit_sha}'에서 변경된 파일 목록과 각 파일의 전체 내용을 가져와줘."
-        start = time.time() # LLM 호출 시간 측정 용.
-        commitResult = await mcp_client_instance.process_query(query) # TODO: process_query 함수 모듈화 or 함수명 변경
-
-        if not commitResult:
+        # 전체 커밋을 한 번에 받지 않고 page 단위로 받아 가져오기와 분석을 겹침
+        try:
+            return await analyze_commit_pages(repo_full_name, commit_sha, None, data['head_commit'].get('removed', []))
+        except RuntimeError as e:
+            print(f"커밋 데이터 조회에 실패했습니다: {e}")
             return {"status": "error", "message": "커밋 데이터 조회에 실패했습니다."}
-        print(f"LLM Tool Calling Time : {time.time()-start:.4f} sec") # Tool 호출 시간 출력
-
-        
-        ## 이후 진행
-        # 파일 정보 정리 용 Logging.
-        print("===================================================================================================================")
-        print("===================================================================================================================")
-        print(" * 변경된 파일 갯수 : ", len(commitResult['files']))
-        for i in range(len(commitResult['files'])):
-            print(str(i+1) + " . " + "변경된 파일 명 : ", commitResult["files"][i]['fileName'])
-            print(str(i+1) + " . " + "변경된 파일 코드 : ", commitResult["files"][i]['code'])
-        
-        # RAG 불러오기.
-        files = commitResult['files']
-        overall = []
-        for i in range(len(files)):
-            file_path = files[i]['fileName']
-            file_code = files[i]['code']
-
-            # 파일 전체 -> 특징점 추출.
-            feats = extract_features(file_path=file_path, full_text=file_code)
-            print("===================================================================================================================")
-            print("===================================================================================================================")
-            print(" ** feats : ", feats)
-
-            # 특징 기반으로 요약 질의 생성
-            feature_query = build_query_from_features(feats)
-            print("===================================================================================================================")
-            print("===================================================================================================================")
-            print(" ** feature_query : ", feature_query)
-
-            # RAG 검색
-            candidates = search_requirements(vector_store, feature_query, k=5)
-            print("===================================================================================================================")
-            print("===================================================================================================================")
-            print(" ** candidates : ", candidates)
-
-        return commitResult # TODO: 편의상 리턴한거고 확정아님
     
     except KeyError as e:
         print(f"Webhook payload에서 필요한 키를 찾을 수 없습니다: {e}")
@@ -138,7 +225,123 @@ async def github_webhook(request: Request):
     except Exception as e:
         print(f"Webhook 처리 중 오류 발생: {e}")
         return {"status": "error", "message": str(e)}
-    
+
+
+async def analyze_coalesced_push(merged: dict):
+    """병합된 push 의 최종 커밋 기준으로, 변경된 파일들의 마지막 상태만 한 번씩 분석합니다."""
+    repo_full_name = merged['repository']['full_name']
+    target_files = [f for f, status in merged['files'].items() if status != 'removed']
+    removed_files = [f for f, status in merged['files'].items() if status == 'removed']
+    print(f"병합 push 분석: {repo_full_name}, push {merged['push_count']}개, Commit SHA: {merged['after']}")
+
+    # 병합된 모든 커밋 메시지를 함께 분석에 사용
+    message = "\n".join(c.get('message', '') for c in merged['commits'])
+    try:
+        return await analyze_commit_pages(repo_full_name, merged['after'], target_files if target_files else None,
+                                          removed_files, message=message)
+    except RuntimeError as e:
+        print(f"병합 push 커밋 데이터 조회에 실패했습니다: {e}")
+        return None
+
+
+# 판정 LLM 호출 (JUDGE_CONSTRAINED_OUTPUT=0 이면 schema 제한/스트리밍 없이 전체 응답 대기)
+llm_call = make_judge_llm_call(llm, constrained=os.getenv("JUDGE_CONSTRAINED_OUTPUT", "1") != "0")
+
+
+async def analyze_commit_pages(repo_full_name: str, commit_sha: str, file_paths: list = None,
+                               removed_files: list = (), message: str = None):
+    """get_commit_data_page 로 파일을 page 단위로 받아, 다음 page 를 가져오는 동안 현재 page 를 분석합니다.
+
+    파일 내용은 page 분석이 끝나면 버리므로 메모리 사용량은 전체 커밋 크기가 아닌 page 크기에 비례한다.
+    """
+    started = time.time()
+    commitResult, overall = None, []
+
+    async def publish_fetch_progress(progress: float, total: float | None, message: str | None):
+        # MCP 서버가 page 내용을 읽는 동안 보내는 진행 알림을 대시보드로 전달
+        event_bus.publish("commit_fetch_progress", {
+            "repo": repo_full_name, "sha": commit_sha, "fetched": int(progress),
+            "total": int(total) if total is not None else None,
+        })
+
+    async for page in mcp_client_instance.iter_commit_pages(repo_full_name, commit_sha, file_paths,
+                                                            progress_callback=publish_fetch_progress):
+        if commitResult is None:
+            commitResult = {k: page.get(k) for k in ('resultStatus', 'author', 'email', 'message', 'sha')}
+            commitResult['message'] = message or commitResult['message'] or ''
+            event_bus.publish("analysis_started", {
+                "repo": repo_full_name, "sha": commitResult['sha'], "totalFiles": page.get('totalFiles'),
+            })
+        print(f" * page {page['cursor']}~ : 파일 {len(page['files'])}개 / 전체 {page.get('totalFiles')}개")
+        overall.extend(await analyze_files(page['files'], commitResult['message'], repo_full_name, commitResult['sha']))
+
+    commitResult['verdicts'] = overall
+    progress = await finish_analysis(repo_full_name, commitResult['sha'], overall, removed_files, started)
+    if progress is not None:
+        commitResult['progress'] = progress
+    return commitResult
+
+
+async def analyze_files(files: list, message: str, repo_full_name: str, commit_sha: str) -> list:
+    """파일 목록의 특징 추출, 요구사항 RAG 검색 및 충족 판정 결과 [{fileName, verdicts}] 를 반환합니다."""
+    overall = []
+    feats_list = []
+    feature_queries = []
+    for i in range(len(files)):
+        file_path = files[i]['fileName']
+        file_code = files[i]['code']
+
+        # 파일 전체 -> 특징점 추출.
+        feats = extract_features(file_path=file_path, full_text=file_code)
+        print("===================================================================================================================")
+        print("===================================================================================================================")
+        print(" ** feats : ", feats)
+
+        # 특징 기반으로 요약 질의 생성
+        feature_query = build_query_from_features(feats)
+        print("===================================================================================================================")
+        print("===================================================================================================================")
+        print(" ** feature_query : ", feature_query)
+        feats_list.append(feats)
+        feature_queries.append(feature_query)
+
+    # RAG 검색 (커밋 메시지에 요구사항 ID 가 있으면 ID 로 직접 조회, 없으면 파일별 질의를 한 번에 검색, RETRIEVAL_MODE=hybrid 이면 BM25 결합)
+    all_candidates = route_requirements_batch(vector_store, message, feature_queries, k=5,
+                                              lexical_index=lexical_index)
+    for i, candidates in enumerate(all_candidates):
+        print("===================================================================================================================")
+        print("===================================================================================================================")
+        print(" ** candidates : ", candidates)
+        event_bus.publish("file_candidates", {
+            "repo": repo_full_name, "sha": commit_sha, "fileName": files[i]['fileName'],
+            "candidates": [{"req_id": candidate_req_id(meta), "title": meta.get("title", ""), "score": score,
+                            "retrieval": meta.get("retrieval", "vector")} for meta, score in candidates],
+        })
+
+        # 요구사항 충족 판정 (명확한 후보는 게이트에서 판정, 애매한 후보만 LLM 호출)
+        verdicts = await judge_candidates(llm_call, feature_queries[i], feats_list[i], candidates,
+                                          gate_thresholds, patch=files[i].get('patch', ''))
+        print(" ** verdicts : ", verdicts)
+        overall.append({"fileName": files[i]['fileName'], "verdicts": verdicts})
+        event_bus.publish("file_verdicts", {
+            "repo": repo_full_name, "sha": commit_sha, "fileName": files[i]['fileName'], "verdicts": verdicts,
+        })
+    return overall
+
+
+async def finish_analysis(repo_full_name: str, commit_sha: str, overall: list, removed_files, started: float):
+    """판정 결과를 기록하고 요구사항별 진척률을 증분 갱신합니다 (진척률 저장소 미사용 시 None)"""
+    progress = None
+    if progress_store and repo_full_name:
+        progress = await asyncio.to_thread(progress_store.record_commit, repo_full_name, commit_sha, overall, removed_files)
+        print(" ** progress : ", progress)
+        for req_id, req_progress in progress.items():
+            event_bus.publish("requirement_progress", {"repo": repo_full_name, "sha": commit_sha, "req_id": req_id, **req_progress})
+
+    event_bus.publish("analysis_completed", {
+        "repo": repo_full_name, "sha": commit_sha, "files": len(overall), "elapsed": round(time.time() - started, 3),
+    })
+    return progress
 
 if __name__ == "__main__":
     # Uvicorn을 사용하여 FastAPI 애플리케이션 실행
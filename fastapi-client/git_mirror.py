@@ -0,0 +1,162 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:     # Windows: 프로세스 간 lock 없이 thread lock 만 사용
+    fcntl = None
+
+
+# git diff-tree 상태 코드 -> GitHub API 의 file status 명칭
+STATUS_NAMES = {
+    "A": "added", "M": "modified", "D": "removed", "R": "renamed",
+    "C": "copied", "T": "changed",
+}
+
+
+class GitMirror:
+    """로컬 bare mirror 에서 커밋의 변경 파일 / patch / blob 내용을 읽어오는 클래스
+
+    repo 마다 `git clone --mirror` 로 한 번 받아두고, 이후에는 push 마다 `git fetch` 로 증분만 받는다.
+    url_template 에 로컬 경로를 주면 (예: '/srv/repos/{repo}') 네트워크 없이 동작한다.
+    여러 thread / 프로세스 (stdio MCP 서버 pool 등) 에서 호출되므로 clone / fetch 는 repo 별 lock
+    (프로세스 안에서는 RLock, 프로세스 사이에서는 '<mirror>.lock' 파일의 flock) 안에서 하나씩만 수행한다.
+    """
+
+    def __init__(self, root_dir: Optional[str] = None, url_template: Optional[str] = None):
+        self.root_dir = Path(root_dir or os.getenv("MIRROR_ROOT", "./mirrors"))
+        self.url_template = url_template or os.getenv("MIRROR_URL_TEMPLATE", "https://github.com/{repo}.git")
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _repo_lock(self, repo_full_name: str) -> threading.RLock:
+        with self._locks_guard:
+            return self._locks.setdefault(repo_full_name, threading.RLock())
+
+    @contextmanager
+    def _process_lock(self, repo_full_name: str):
+        """같은 mirror 를 쓰는 다른 프로세스와 clone / fetch 가 겹치지 않도록 '<mirror>.lock' 에 flock 을 겁니다"""
+        if fcntl is None:
+            yield
+            return
+        path = self.mirror_path(repo_full_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def mirror_path(self, repo_full_name: str) -> Path:
+        return self.root_dir / (repo_full_name.replace("/", "__") + ".git")
+
+    def _git(self, repo_full_name: str, *args: str, input: Optional[bytes] = None) -> bytes:
+        result = subprocess.run(
+            ["git", "--git-dir", str(self.mirror_path(repo_full_name)), *args],
+            input=input, capture_output=True, check=True
+        )
+        return result.stdout
+
+    def sync(self, repo_full_name: str) -> None:
+        """mirror 가 없으면 clone, 있으면 증분 fetch 를 수행합니다"""
+        path = self.mirror_path(repo_full_name)
+        with self._repo_lock(repo_full_name), self._process_lock(repo_full_name):
+            if path.exists():
+                self._git(repo_full_name, "fetch", "--prune", "--quiet", "origin")
+                return
+            # 임시 디렉터리에 clone 한 뒤 rename 하여, 중단된 clone 을 mirror 로 착각하지 않도록 함
+            tmp_dir = tempfile.mkdtemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+            try:
+                url = self.url_template.format(repo=repo_full_name)
+                subprocess.run(["git", "clone", "--mirror", "--quiet", url, tmp_dir], capture_output=True, check=True)
+                try:
+                    os.rename(tmp_dir, path)
+                except OSError:
+                    if not path.exists():   # 다른 프로세스가 먼저 만든 경우만 무시
+                        raise
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def ensure_commit(self, repo_full_name: str, commit_sha: str) -> None:
+        """커밋이 mirror 에 없을 때만 fetch 합니다 (이미 받은 커밋은 디스크만 읽음)"""
+        if self._has_commit(repo_full_name, commit_sha):
+            return
+        with self._repo_lock(repo_full_name):
+            # lock 을 기다리는 동안 다른 thread 가 이미 받아왔을 수 있음
+            if not self._has_commit(repo_full_name, commit_sha):
+                self.sync(repo_full_name)
+
+    def _has_commit(self, repo_full_name: str, commit_sha: str) -> bool:
+        if not self.mirror_path(repo_full_name).exists():
+            return False
+        try:
+            self._git(repo_full_name, "cat-file", "-e", f"{commit_sha}^{{commit}}")
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def get_commit_info(self, repo_full_name: str, commit_sha: str) -> Dict[str, str]:
+        out = self._git(repo_full_name, "log", "-1", "--format=%H%x00%an%x00%ae%x00%B", commit_sha)
+        sha, author, email, message = out.decode("utf-8", errors="replace").split("\x00", 3)
+        return {"sha": sha, "author": author, "email": email, "message": message.rstrip("\n")}
+
+    def get_changed_files(self, repo_full_name: str, commit_sha: str) -> List[Dict[str, str]]:
+        """첫 번째 부모 대비 변경된 파일 목록과 파일별 patch 를 반환합니다 (GitHub commit files 와 같은 키)"""
+        base_args = ["diff-tree", "-r", "-M", "--root", "--no-commit-id", "-m", "--first-parent", commit_sha]
+
+        fields = self._git(repo_full_name, *base_args, "--name-status", "-z").decode("utf-8").split("\x00")
+        files = []
+        i = 0
+        while i < len(fields) and fields[i]:
+            code = fields[i][0]
+            if code in ("R", "C"):
+                files.append({"filename": fields[i + 2], "previous_filename": fields[i + 1],
+                              "status": STATUS_NAMES[code]})
+                i += 3
+            else:
+                files.append({"filename": fields[i + 1], "status": STATUS_NAMES.get(code, "modified")})
+                i += 2
+
+        # diff-tree 는 --name-status 와 같은 순서로 patch 를 출력한다
+        patch_text = self._git(repo_full_name, *base_args, "-p").decode("utf-8", errors="replace")
+        patches = [p for p in re.split(r"(?m)^(?=diff --git )", patch_text) if p]
+        for file, patch in zip(files, patches):
+            hunk_start = patch.find("\n@@")
+            file["patch"] = patch[hunk_start + 1:] if hunk_start >= 0 else ""
+        return files
+
+    def read_blobs(self, repo_full_name: str, commit_sha: str, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """`git cat-file --batch` 한 번으로 여러 파일 내용을 읽습니다 (바이너리/부재 시 None)"""
+        if not file_paths:
+            return {}
+        request = "".join(f"{commit_sha}:{path}\n" for path in file_paths).encode("utf-8")
+        out = self._git(repo_full_name, "cat-file", "--batch", input=request)
+
+        contents: Dict[str, Optional[str]] = {}
+        pos = 0
+        for path in file_paths:
+            header_end = out.index(b"\n", pos)
+            header = out[pos:header_end].split()
+            pos = header_end + 1
+            if len(header) < 3 or header[1] != b"blob":
+                contents[path] = None
+                continue
+            size = int(header[2])
+            data = out[pos:pos + size]
+            pos += size + 1
+            if b"\x00" in data:
+                contents[path] = None
+                continue
+            try:
+                contents[path] = data.decode("utf-8")
+            except UnicodeDecodeError:
+                contents[path] = None
+        return contents
@@ -0,0 +1,154 @@
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# 코드 식별자(camelCase, snake_case, 경로), 숫자, 한글 단어
+TOKEN_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9_]*|\d+|[가-힣]+')
+CAMEL_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def tokenize(text: str) -> List[str]:
+    """식별자는 원형 + camelCase/snake_case 조각, 한글은 단어 + 2-gram 으로 나눕니다"""
+    tokens = []
+    for word in TOKEN_PATTERN.findall(text):
+        if word[0] >= '가':
+            tokens.append(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        lower = word.lower()
+        tokens.append(lower)
+        parts = [p.lower() for piece in word.split('_') for p in CAMEL_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1)
+    return tokens
+
+
+MAX_REQUIREMENT_TERMS = 30
+
+
+def requirement_terms(req_meta: Dict) -> List[str]:
+    """요구사항 제목/본문에서 비교할 핵심 term 을 뽑습니다 (짧은 조각, 한글 2-gram 제외)"""
+    text = f"{req_meta.get('title', '')}\n{req_meta.get('snippet', '')}"
+    words = set(TOKEN_PATTERN.findall(text))
+    terms = []
+    for term in tokenize(text):
+        if term[0] >= '가':
+            if len(term) >= 2 and term in words:
+                terms.append(term)
+        elif len(term) >= 3 and not term.isdigit():
+            terms.append(term)
+    return list(dict.fromkeys(terms))[:MAX_REQUIREMENT_TERMS]
+
+
+class BM25Index:
+    """요구사항 섹션에 대한 BM25 역색인 (임베딩 호출 없이 프로세스 내에서 검색)"""
+
+    def __init__(self, documents: List[str], metadatas: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # term -> [(doc_idx, tf)]
+        self.doc_lens: List[int] = []
+        for idx, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            self.doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((idx, tf))
+
+        n = len(documents)
+        self.avg_len = (sum(self.doc_lens) / n) if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs) -> "BM25Index":
+        return cls([d.page_content for d in documents], [dict(d.metadata) for d in documents], **kwargs)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """(문서 index, BM25 점수) 를 점수 내림차순으로 k 개 반환합니다"""
+        scores: Dict[int, float] = defaultdict(float)
+        for term, qtf in Counter(tokenize(query)).items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[idx] / self.avg_len)
+                scores[idx] += qtf * idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda x: -x[1])[:k]
+
+
+def candidate_req_id(meta: Dict) -> Optional[str]:
+    # req_id 메타데이터가 없는 (이전에 생성된) 벡터 DB chunk 는 본문의 첫 요구사항 ID 로 판단
+    if meta.get("req_id"):
+        return meta["req_id"]
+    m = re.search(r'[A-Z]{3}-\d{3}', meta.get("snippet", ""))
+    return m.group(0) if m else None
+
+
+def evaluate_retrieval(labeled_queries: List[Tuple[str, List[str]]], searchers: Dict[str, object], k: int = 5) -> Dict[str, Dict[str, float]]:
+    """(질의, 정답 req_id 목록) 으로 검색 방식별 recall@k 와 평균 지연시간(ms) 을 측정합니다
+
+    searchers 는 이름 -> (query, k) 를 받아 [(meta, score), ...] 를 반환하는 함수.
+    """
+    report = {}
+    for name, search in searchers.items():
+        hits, elapsed = 0, 0.0
+        for query, expected in labeled_queries:
+            start = time.perf_counter()
+            results = search(query, k)
+            elapsed += time.perf_counter() - start
+            hits += any(candidate_req_id(meta) in expected for meta, _ in results)
+        report[name] = {
+            f"recall@{k}": hits / len(labeled_queries),
+            "mean_ms": elapsed * 1000 / len(labeled_queries),
+        }
+    return report
+
+
+def build_feature_queries(commits: List[Dict]) -> List[Tuple[str, List[str]]]:
+    """get_commit_data 결과 중 커밋 메시지에 요구사항 ID 가 적힌 커밋의 파일마다 (파일 특징 질의, 정답 req_id 목록) 을 만듭니다
+
+    질의는 실제 분석과 같은 build_query_from_features 결과이므로, 요구사항 문서 문장을 질의로 쓰는 것과 달리 색인 내용과 겹치지 않는다.
+    """
+    from rag_feature import extract_features, build_query_from_features
+    from rag_utils import extract_requirement_ids
+
+    queries = []
+    for commit in commits:
+        req_ids = extract_requirement_ids(commit.get("message", ""))
+        if not req_ids:
+            continue
+        for file in commit.get("files", []):
+            queries.append((build_query_from_features(extract_features(file["fileName"], file["code"])), req_ids))
+    return queries
+
+
+# 평가 : python fastapi-client/lexical_index.py commits.jsonl [lexical vector hybrid]
+#   (프로젝트 루트에서, 한 줄에 get_commit_data 결과 1개, 커밋 메시지의 요구사항 ID 를 정답으로 사용, vector/hybrid 는 Ollama bge-m3 필요)
+if __name__ == "__main__":
+    import json
+    import sys
+    from rag_boot import load_or_build_vector_store, load_requirement_sections
+    from rag_utils import search_requirements, hybrid_search_requirements, lexical_search_requirements
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        labeled = build_feature_queries([json.loads(line) for line in f if line.strip()])
+    if not labeled:
+        sys.exit("요구사항 ID 가 커밋 메시지에 적힌 커밋이 없습니다.")
+    names = sys.argv[2:] or ["lexical", "vector", "hybrid"]
+
+    bm25 = BM25Index.from_documents(load_requirement_sections())
+    vector_store = load_or_build_vector_store()[0] if {"vector", "hybrid"} & set(names) else None
+    searchers = {
+        "lexical": lambda q, k: lexical_search_requirements(bm25, q, k=k),
+        "vector": lambda q, k: search_requirements(vector_store, q, k=k),
+        "hybrid": lambda q, k: hybrid_search_requirements(vector_store, bm25, q, k=k),
+    }
+    report = evaluate_retrieval(labeled, {name: searchers[name] for name in names})
+    print(f"질의 {len(labeled)}개 (파일 특징 질의)")
+    for name, stats in report.items():
+        print(f"{name:8s} " + " ".join(f"{key}={value:.4f}" for key, value in stats.items()))
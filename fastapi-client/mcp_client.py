@@ -1,48 +1,200 @@
-from typing import Optional
-from contextlib import AsyncExitStack
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import timedelta
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
 
 from langchain_ollama.chat_models import ChatOllama
 from langchain_core.messages import HumanMessage
 
 
-class MCPClient:
-    def __init__(self):
+class PooledSession:
+    """pool 의 연결 1개. 연결(transport + ClientSession) 은 supervisor task 안에서 열고 닫는다"""
+
+    def __init__(self, index: int):
+        self.index = index
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
+        self.generation = 0          # 재연결마다 증가 (idle queue 에 남은 이전 연결 항목 무시용)
+        self.healthy = False
+        self.broken = asyncio.Event()
+        self.ready = asyncio.Event()
+
+    def mark_broken(self) -> None:
+        self.healthy = False
+        self.broken.set()
+
 
-    async def connect_to_server(self, server_script_path: str):
+class MCPClientPool:
+    """MCP 서버와의 세션 여러 개를 유지하여 tool 호출을 병렬로 처리하는 pool
 
-        if not server_script_path.endswith('.py'):
+    target 이 http(s) URL 이면 streamable HTTP 서버에, .py 경로면 stdio subprocess 에 연결한다.
+    세션마다 supervisor task 가 연결을 소유하며, 오류 또는 health check(ping) 실패 시 backoff 후 재연결한다.
+    """
+
+    def __init__(self, target: str, size: Optional[int] = None, health_interval: Optional[float] = None,
+                 call_timeout: Optional[float] = None):
+        self.target = target
+        self.size = int(os.getenv("MCP_POOL_SIZE", "4")) if size is None else size
+        self.health_interval = float(os.getenv("MCP_HEALTH_INTERVAL", "30")) if health_interval is None else health_interval
+        self.call_timeout = float(os.getenv("MCP_CALL_TIMEOUT", "120")) if call_timeout is None else call_timeout
+        self.members = [PooledSession(i) for i in range(self.size)]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self.stats = {"calls": 0, "call_failures": 0, "reconnects": 0, "health_failures": 0, "wait_ms": 0.0}
+
+    @property
+    def is_http(self) -> bool:
+        return self.target.startswith(("http://", "https://"))
+
+    def _transport(self):
+        if self.is_http:
+            return streamablehttp_client(self.target)
+        if not self.target.endswith('.py'):
             raise ValueError("Server script must be a .py file")
-            
-        server_params = StdioServerParameters(
-            command="python",
-            args=[server_script_path],
-            env=None
-        )
-        
-        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-        self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
-        
-        await self.session.initialize()
-        
+        return stdio_client(StdioServerParameters(command="python", args=[self.target], env=None))
+
+    async def start(self, timeout: float = 30.0) -> None:
+        self._tasks = [asyncio.create_task(self._supervise(member)) for member in self.members]
+        self._tasks.append(asyncio.create_task(self._health_loop()))
+        try:
+            await asyncio.wait_for(asyncio.gather(*(m.ready.wait() for m in self.members)), timeout)
+        except asyncio.TimeoutError:
+            if not any(m.healthy for m in self.members):
+                await self.close()
+                raise ConnectionError(f"MCP 서버에 연결할 수 없습니다: {self.target}")
+        print(f"MCP 세션 pool 연결: {self.target} ({sum(m.healthy for m in self.members)}/{self.size})")
+
+    async def _supervise(self, member: PooledSession) -> None:
+        backoff = 1.0
+        while not self._closing:
+            try:
+                async with AsyncExitStack() as stack:
+                    streams = await stack.enter_async_context(self._transport())
+                    session = await stack.enter_async_context(ClientSession(streams[0], streams[1]))
+                    await session.initialize()
+
+                    member.session = session
+                    member.generation += 1
+                    member.healthy = True
+                    member.broken.clear()
+                    self._idle.put_nowait((member, member.generation))
+                    member.ready.set()
+                    backoff = 1.0
+                    await member.broken.wait()
+            except Exception as e:
+                while isinstance(e, BaseExceptionGroup) and e.exceptions:
+                    e = e.exceptions[0]  # transport TaskGroup 오류는 실제 원인만 출력
+                print(f"[mcp-pool] 세션 {member.index} 연결 오류: {type(e).__name__}: {e}")
+            member.healthy = False
+            member.session = None
+            if self._closing:
+                break
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _health_loop(self) -> None:
+        while not self._closing:
+            await asyncio.sleep(self.health_interval)
+            for member in self.members:
+                if not member.healthy:
+                    continue
+                try:
+                    await asyncio.wait_for(member.session.send_ping(), timeout=10)
+                except Exception as e:
+                    print(f"[mcp-pool] 세션 {member.index} health check 실패: {e}")
+                    self.stats["health_failures"] += 1
+                    member.mark_broken()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """사용 가능한 세션 하나를 빌려줍니다 (모두 사용 중이면 반환될 때까지 대기)"""
+        start = time.perf_counter()
+        while True:
+            member, generation = await self._idle.get()
+            if member.healthy and member.generation == generation:
+                break
+        self.stats["wait_ms"] += (time.perf_counter() - start) * 1000
+        try:
+            yield member
+        finally:
+            if member.healthy and member.generation == generation:
+                self._idle.put_nowait((member, generation))
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], retries: int = 1, progress_callback=None):
+        """tool 을 호출합니다. 연결 오류 시 해당 세션을 재연결 대상으로 표시하고 다른 세션으로 재시도"""
+        for attempt in range(retries + 1):
+            async with self.acquire() as member:
+                try:
+                    self.stats["calls"] += 1
+                    return await member.session.call_tool(
+                        name, arguments, read_timeout_seconds=timedelta(seconds=self.call_timeout),
+                        progress_callback=progress_callback)
+                except McpError:
+                    # 서버가 오류 응답을 보낸 경우 (연결은 정상)
+                    self.stats["call_failures"] += 1
+                    raise
+                except Exception as e:
+                    self.stats["call_failures"] += 1
+                    member.mark_broken()
+                    if attempt == retries:
+                        raise
+                    print(f"[mcp-pool] 세션 {member.index} 호출 실패, 재시도: {e}")
+
+    async def list_tools(self):
+        async with self.acquire() as member:
+            return await member.session.list_tools()
+
+    async def close(self) -> None:
+        self._closing = True
+        for member in self.members:
+            member.broken.set()
+        # supervisor 는 broken 신호로 스스로 연결을 닫고 종료 (연결을 연 task 에서 닫아야 함), health check 만 취소
+        health_task, supervisors = self._tasks[-1:], self._tasks[:-1]
+        for task in health_task:
+            task.cancel()
+        done, pending = await asyncio.wait(supervisors, timeout=10) if supervisors else (set(), set())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class MCPClient:
+    def __init__(self):
+        self.pool: Optional[MCPClientPool] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.pool is not None and any(m.healthy for m in self.pool.members)
+
+    async def connect_to_server(self, server_script_path: str, pool_size: Optional[int] = None):
+        """server_script_path 가 .py 경로면 stdio subprocess, http(s) URL 이면 streamable HTTP 서버에 세션 pool 로 연결합니다"""
+        self.pool = MCPClientPool(server_script_path, size=pool_size)
+        await self.pool.start()
+
         # List available tools
-        response = await self.session.list_tools()
+        response = await self.pool.list_tools()
         print("\nConnected to server with tools:", [tool.name for tool in response.tools])
 
+    async def list_tools(self):
+        return await self.pool.list_tools()
+
     async def process_query(self, query: str) -> str:
 
         llm = ChatOllama(
             model="qwen3:4b",
             temperature=0.8
-        )   
+        )
 
-        tool_response = await self.session.list_tools()
-        available_tools = [{ 
+        tool_response = await self.pool.list_tools()
+        available_tools = [{
             "name": tool.name,
             "description": tool.description,
             "input_schema": tool.inputSchema
@@ -60,7 +212,7 @@ class MCPClient:
         if init_response.tool_calls:
             tool_call = init_response.tool_calls[-1]
             # print(f"Executing tool: {tool_call['name']} with args: {tool_call['args']}")
-            tool_response = await self.session.call_tool(tool_call['name'], tool_call['args'])
+            tool_response = await self.pool.call_tool(tool_call['name'], tool_call['args'])
 
         if not tool_response.isError:
             # print("Tool response:", tool_response.structuredContent)
@@ -70,6 +222,90 @@ class MCPClient:
             return False
 
 
+    async def get_commit_data(self, repo_name: str, commit_sha: str, file_paths: Optional[List[str]] = None):
+        """LLM tool 선택 없이 get_commit_data tool 을 직접 호출합니다"""
+        args = {"repo_name": repo_name, "commit_sha": commit_sha}
+        if file_paths is not None:
+            args["file_paths"] = file_paths
+
+        tool_response = await self.pool.call_tool("get_commit_data", args)
+        if tool_response.isError:
+            return False
+        return tool_response.structuredContent
+
+    async def iter_commit_pages(self, repo_name: str, commit_sha: str, file_paths: Optional[List[str]] = None,
+                                page_size: Optional[int] = None, progress_callback=None) -> AsyncIterator[Dict[str, Any]]:
+        """get_commit_data_page 를 cursor 로 이어 호출하며 page(CommitPage) 를 하나씩 내보냅니다
+
+        다음 page 는 현재 page 가 소비되는 동안 미리 1개만 가져오므로(prefetch), 가져오기와 분석이 겹치면서도
+        클라이언트가 들고 있는 파일 내용은 최대 2 page 로 제한된다. 조회 실패 시 RuntimeError.
+        """
+        page_size = int(os.getenv("COMMIT_PAGE_SIZE", "10")) if page_size is None else page_size
+
+        async def fetch(cursor: int):
+            args = {"repo_name": repo_name, "commit_sha": commit_sha, "cursor": cursor, "page_size": page_size}
+            if file_paths is not None:
+                args["file_paths"] = file_paths
+            response = await self.pool.call_tool("get_commit_data_page", args, progress_callback=progress_callback)
+            page = None if response.isError else response.structuredContent
+            if not page or page.get("resultStatus") != "success":
+                raise RuntimeError(f"커밋 데이터 page 조회 실패 (cursor={cursor})")
+            return page
+
+        pending = asyncio.create_task(fetch(0))
+        try:
+            while pending is not None:
+                page = await pending
+                pending = asyncio.create_task(fetch(page["nextCursor"])) if page.get("nextCursor") is not None else None
+                yield page
+        finally:
+            if pending is not None:
+                pending.cancel()
+
     async def cleanup(self):
         """Clean up resources"""
-        await self.exit_stack.aclose()
\ No newline at end of file
+        if self.pool:
+            await self.pool.close()
+
+
+async def benchmark_pool(target: str, tool: str, arguments: Dict[str, Any], concurrency_levels=(1, 4, 16),
+                         calls_per_caller: int = 5, pool_sizes=(1, 4, 16)) -> Dict[str, Dict[str, float]]:
+    """pool 크기별로 동시 호출자 수(1/4/16)에 따른 처리량과 지연시간을 측정합니다"""
+    report = {}
+    for size in pool_sizes:
+        pool = MCPClientPool(target, size=size)
+        await pool.start(timeout=60)
+        try:
+            for callers in concurrency_levels:
+                latencies: List[float] = []
+
+                async def caller():
+                    for _ in range(calls_per_caller):
+                        start = time.perf_counter()
+                        await pool.call_tool(tool, arguments)
+                        latencies.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                await asyncio.gather(*(caller() for _ in range(callers)))
+                elapsed = time.perf_counter() - start
+                latencies.sort()
+                report[f"pool={size} callers={callers}"] = {
+                    "calls_per_sec": len(latencies) / elapsed,
+                    "p50_ms": latencies[len(latencies) // 2],
+                    "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)],
+                }
+        finally:
+            await pool.close()
+    return report
+
+
+# 벤치마크 : python fastapi-client/mcp_client.py http://127.0.0.1:8765/mcp get_commit_data '{"repo_name": "...", "commit_sha": "..."}'
+#          (대상이 fastmcp-server/mcp_server.py 이면 stdio subprocess pool)
+if __name__ == "__main__":
+    import json
+    import sys
+
+    target, tool_name = sys.argv[1], sys.argv[2]
+    tool_args = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {}
+    for name, stats in asyncio.run(benchmark_pool(target, tool_name, tool_args)).items():
+        print(f"{name:22s} " + " ".join(f"{k}={v:.2f}" for k, v in stats.items()))
@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# 상태별 진척 가중치 : 요구사항 진척률 = (meets + 0.5 * partial) / 판정된 관련 파일 수
+STATUS_WEIGHTS = {"Meets": 1.0, "Partial": 0.5, "Missing": 0.0, "Conflict": 0.0}
+STATUS_COLUMNS = {"Meets": "meets", "Partial": "partial", "Missing": "missing", "Conflict": "conflict"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo        TEXT NOT NULL,
+    commit_sha  TEXT NOT NULL,
+    file_path   TEXT NOT NULL,
+    req_id      TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    confidence  REAL NOT NULL,
+    decided_by  TEXT,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_commit ON verdicts (repo, commit_sha);
+
+-- (파일, 요구사항) 별 최신 판정 : 집계 증감 계산용
+CREATE TABLE IF NOT EXISTS file_status (
+    repo        TEXT NOT NULL,
+    file_path   TEXT NOT NULL,
+    req_id      TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    commit_sha  TEXT NOT NULL,
+    PRIMARY KEY (repo, req_id, file_path)
+);
+CREATE INDEX IF NOT EXISTS idx_file_status_file ON file_status (repo, file_path);
+
+-- 요구사항별 materialized 집계 (커밋마다 바뀐 요구사항만 증분 갱신)
+CREATE TABLE IF NOT EXISTS requirement_progress (
+    repo        TEXT NOT NULL,
+    req_id      TEXT NOT NULL,
+    title       TEXT NOT NULL DEFAULT '',
+    meets       INTEGER NOT NULL DEFAULT 0,
+    partial     INTEGER NOT NULL DEFAULT 0,
+    missing     INTEGER NOT NULL DEFAULT 0,
+    conflict    INTEGER NOT NULL DEFAULT 0,
+    progress    REAL NOT NULL DEFAULT 0,
+    delta       REAL NOT NULL DEFAULT 0,
+    last_commit TEXT,
+    updated_at  REAL,
+    PRIMARY KEY (repo, req_id)
+);
+
+CREATE TABLE IF NOT EXISTS progress_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo        TEXT NOT NULL,
+    req_id      TEXT NOT NULL,
+    commit_sha  TEXT NOT NULL,
+    progress    REAL NOT NULL,
+    delta       REAL NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_req ON progress_history (repo, req_id, id);
+"""
+
+
+def compute_progress(meets: int, partial: int, missing: int, conflict: int) -> float:
+    judged = meets + partial + missing + conflict
+    if not judged:
+        return 0.0
+    return round(100.0 * (meets * STATUS_WEIGHTS["Meets"] + partial * STATUS_WEIGHTS["Partial"]) / judged, 2)
+
+
+def is_unrelated(verdict: Dict[str, Any]) -> bool:
+    # 게이트가 '유사도 낮음 + 근거 없음' 으로 판정한 파일은 해당 요구사항과 무관한 파일로 보고 집계에서 제외
+    return verdict.get("decided_by") == "gate" and verdict.get("status") == "Missing"
+
+
+class ProgressStore:
+    """커밋/파일별 판정을 SQLite 에 기록하고 요구사항별 진척률 집계를 증분 갱신하는 클래스
+
+    집계는 커밋에서 판정이 바뀐 (파일, 요구사항) 쌍만큼만 갱신하므로, 기록 비용과 조회 비용 모두
+    누적 이력 길이와 무관하다. 조회는 모두 PK / index 로 처리한다.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("PROGRESS_DB_PATH", "./fastapi-client/progress.db")
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 기록
+    # ------------------------------------------------------------------
+    def record_commit(self, repo: str, commit_sha: str, file_verdicts: List[Dict[str, Any]],
+                      removed_files: Iterable[str] = ()) -> Dict[str, Dict[str, float]]:
+        """analyze_files 의 파일별 판정({fileName, verdicts}) 을 기록하고 바뀐 요구사항의 진척률을 반환합니다
+
+        반환값 : req_id -> {"progress", "delta"}
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            changes: Dict[str, Dict[str, int]] = {}   # req_id -> 상태 column 별 증감
+            titles: Dict[str, str] = {}
+
+            def move(req_id: str, old: Optional[str], new: Optional[str]) -> None:
+                if old == new:
+                    return
+                counts = changes.setdefault(req_id, {})
+                if old:
+                    counts[STATUS_COLUMNS[old]] = counts.get(STATUS_COLUMNS[old], 0) - 1
+                if new:
+                    counts[STATUS_COLUMNS[new]] = counts.get(STATUS_COLUMNS[new], 0) + 1
+
+            for file_result in file_verdicts:
+                file_path = file_result["fileName"]
+                for verdict in file_result.get("verdicts", []):
+                    req_id = verdict.get("req_id")
+                    status = verdict.get("status")
+                    # 요구사항 ID 를 알 수 없는 판정(ID 없는 문서 chunk) 은 한 행으로 뭉치지 않도록 집계에서 제외
+                    if not req_id or status not in STATUS_COLUMNS:
+                        continue
+                    titles.setdefault(req_id, verdict.get("req_title", ""))
+                    cur.execute(
+                        "INSERT INTO verdicts (repo, commit_sha, file_path, req_id, status, confidence, decided_by, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (repo, commit_sha, file_path, req_id, status, float(verdict.get("confidence", 0.0)),
+                         verdict.get("decided_by"), now),
+                    )
+                    row = cur.execute("SELECT status FROM file_status WHERE repo = ? AND req_id = ? AND file_path = ?",
+                                      (repo, req_id, file_path)).fetchone()
+                    old = row["status"] if row else None
+                    if is_unrelated(verdict):
+                        if old:
+                            cur.execute("DELETE FROM file_status WHERE repo = ? AND req_id = ? AND file_path = ?",
+                                        (repo, req_id, file_path))
+                        move(req_id, old, None)
+                        continue
+                    cur.execute(
+                        "INSERT INTO file_status (repo, file_path, req_id, status, commit_sha) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (repo, req_id, file_path) DO UPDATE SET status = excluded.status, commit_sha = excluded.commit_sha",
+                        (repo, file_path, req_id, status, commit_sha),
+                    )
+                    move(req_id, old, status)
+
+            # 삭제된 파일은 관련 요구사항 집계에서 빠짐
+            for file_path in removed_files:
+                rows = cur.execute("SELECT req_id, status FROM file_status WHERE repo = ? AND file_path = ?",
+                                   (repo, file_path)).fetchall()
+                cur.execute("DELETE FROM file_status WHERE repo = ? AND file_path = ?", (repo, file_path))
+                for row in rows:
+                    move(row["req_id"], row["status"], None)
+
+            result = {}
+            for req_id in set(changes) | set(titles):
+                result[req_id] = self._apply_counts(cur, repo, req_id, changes.get(req_id, {}),
+                                                    titles.get(req_id, ""), commit_sha, now)
+            return result
+
+    def _apply_counts(self, cur, repo: str, req_id: str, counts: Dict[str, int], title: str,
+                      commit_sha: str, now: float) -> Dict[str, float]:
+        row = cur.execute("SELECT * FROM requirement_progress WHERE repo = ? AND req_id = ?", (repo, req_id)).fetchone()
+        current = {col: (row[col] if row else 0) + counts.get(col, 0) for col in STATUS_COLUMNS.values()}
+        previous = row["progress"] if row else 0.0
+        progress = compute_progress(**current)
+        delta = round(progress - previous, 2)
+
+        cur.execute(
+            "INSERT INTO requirement_progress (repo, req_id, title, meets, partial, missing, conflict, progress, delta, last_commit, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (repo, req_id) DO UPDATE SET title = CASE WHEN excluded.title != '' THEN excluded.title ELSE title END, "
+            "meets = excluded.meets, partial = excluded.partial, missing = excluded.missing, conflict = excluded.conflict, "
+            "progress = excluded.progress, delta = excluded.delta, last_commit = excluded.last_commit, updated_at = excluded.updated_at",
+            (repo, req_id, title, current["meets"], current["partial"], current["missing"], current["conflict"],
+             progress, delta, commit_sha, now),
+        )
+        cur.execute("INSERT INTO progress_history (repo, req_id, commit_sha, progress, delta, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (repo, req_id, commit_sha, progress, delta, now))
+        return {"progress": progress, "delta": delta}
+
+    # ------------------------------------------------------------------
+    # 조회
+    # ------------------------------------------------------------------
+    def get_progress(self, repo: str, req_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM requirement_progress WHERE repo = ? AND req_id = ?",
+                                     (repo, req_id)).fetchone()
+        return dict(row) if row else None
+
+    def list_progress(self, repo: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM requirement_progress WHERE repo = ? ORDER BY req_id",
+                                      (repo,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_history(self, repo: str, req_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """요구사항 진척률 변화 (최신순)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT commit_sha, progress, delta, created_at FROM progress_history "
+                "WHERE repo = ? AND req_id = ? ORDER BY id DESC LIMIT ?", (repo, req_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_commit_verdicts(self, repo: str, commit_sha: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_path, req_id, status, confidence, decided_by FROM verdicts "
+                "WHERE repo = ? AND commit_sha = ? ORDER BY id", (repo, commit_sha)).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_repos(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT repo FROM requirement_progress").fetchall()
+        return [row["repo"] for row in rows]
+
+    def rebuild_aggregates(self, repo: str) -> None:
+        """file_status 로부터 requirement_progress 의 상태별 개수를 다시 계산합니다 (집계 검증/복구용)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE requirement_progress SET meets = 0, partial = 0, missing = 0, conflict = 0 WHERE repo = ?", (repo,))
+            for status, col in STATUS_COLUMNS.items():
+                self._conn.execute(
+                    f"UPDATE requirement_progress SET {col} = (SELECT COUNT(*) FROM file_status f "
+                    f"WHERE f.repo = requirement_progress.repo AND f.req_id = requirement_progress.req_id AND f.status = ?) "
+                    f"WHERE repo = ?", (status, repo))
+            for row in self._conn.execute("SELECT req_id, meets, partial, missing, conflict FROM requirement_progress WHERE repo = ?",
+                                          (repo,)).fetchall():
+                self._conn.execute("UPDATE requirement_progress SET progress = ? WHERE repo = ? AND req_id = ?",
+                                   (compute_progress(row["meets"], row["partial"], row["missing"], row["conflict"]),
+                                    repo, row["req_id"]))
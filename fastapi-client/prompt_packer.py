@@ -0,0 +1,263 @@
+import math
+import os
+import re
+from textwrap import dedent
+from typing import Dict, List, Tuple
+
+from lexical_index import tokenize, requirement_terms, candidate_req_id
+
+# 판정 prompt 토큰 예산
+# - num_ctx : 모델 context 크기 (ChatOllama num_ctx 로도 설정되어 prompt 가 잘리지 않도록 함)
+# - output_tokens : 요구사항 1개 판정 출력에 남겨둘 토큰
+# - safety : 토큰 추정 오차 대비 예산 비율
+PACK_CONFIG = {
+    "num_ctx": int(os.getenv("JUDGE_NUM_CTX", "8192")),
+    "output_tokens": int(os.getenv("JUDGE_OUTPUT_TOKENS", "192")),
+    "max_requirements": int(os.getenv("JUDGE_MAX_REQUIREMENTS", "4")),
+    "requirement_tokens": 320,      # 요구사항 1개 본문 상한
+    "summary_tokens": 384,          # 파일 특징 요약 상한
+    "min_evidence_tokens": 512,     # 변경 hunk / 코드 발췌에 최소한 남길 토큰
+    "safety": 0.85,
+}
+
+# prompt 수 / 판정 수 / 추정 prompt 토큰 합계 (prompt_tokens / verdicts = 판정당 평균 prompt 토큰)
+PACK_STATS = {"prompts": 0, "verdicts": 0, "prompt_tokens": 0}
+
+# 한글/CJK 는 대략 글자당 1 token, 그 외는 약 3.5 글자당 1 token (qwen 계열 tokenizer 기준 보수적 추정)
+WIDE_CHAR_PATTERN = re.compile(r'[ᄀ-ᇿ぀-ヿ㄰-㆏一-鿿가-힣]')
+HUNK_PATTERN = re.compile(r'^@@[^\n]*@@', re.MULTILINE)
+
+JUDGE_PACKED_PROMPT = dedent("""
+You are a strict software requirements reviewer.
+
+Given:
+1) A code file context (file path, summarized features, changed hunks, relevant code excerpts).
+2) A candidate requirement (id/title/snippet).
+
+Decide whether THIS FILE CONTENT suggests the requirement is implemented.
+
+Return strict JSON with:
+- status: "Meets" | "Partial" | "Missing" | "Conflict"
+- confidence: float between 0 and 1
+- evidence: up to 3 bullets (endpoints, method names, SQL tables, config keys)
+- notes: brief advice (e.g., add validation, tests, error handling)
+- coverage: which acceptance aspects seem satisfied vs missing (if applicable)
+
+Be conservative: If acceptance criteria (validation, error handling, tests) are not clearly present in the file, mark as Partial or Missing.
+""").strip()
+
+JUDGE_BATCH_PROMPT = dedent("""
+You are a strict software requirements reviewer.
+
+Given:
+1) A code file context (file path, summarized features, changed hunks, relevant code excerpts).
+2) Several candidate requirements (id/title/snippet).
+
+For EACH requirement, decide whether THIS FILE CONTENT suggests the requirement is implemented.
+
+Return strict JSON {"verdicts": [...]} with exactly one entry per requirement:
+- key: the requirement label exactly as given in brackets (R1, R2, ...)
+- status: "Meets" | "Partial" | "Missing" | "Conflict"
+- confidence: float between 0 and 1
+- evidence: up to 3 bullets (endpoints, method names, SQL tables, config keys)
+- notes: brief advice (e.g., add validation, tests, error handling)
+- coverage: which acceptance aspects seem satisfied vs missing (if applicable)
+
+Be conservative: If acceptance criteria (validation, error handling, tests) are not clearly present in the file, mark as Partial or Missing.
+""").strip()
+
+
+def estimate_tokens(text: str) -> int:
+    wide = len(WIDE_CHAR_PATTERN.findall(text))
+    return wide + math.ceil((len(text) - wide) / 3.5)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """추정 토큰이 budget 이하가 되도록 뒤를 자릅니다"""
+    if budget <= 0:
+        return ""
+    if estimate_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "…"
+
+
+def split_hunks(patch: str) -> List[str]:
+    """unified diff 를 @@ hunk 단위로 나눕니다"""
+    starts = [m.start() for m in HUNK_PATTERN.finditer(patch or "")]
+    return [patch[s:e].rstrip() for s, e in zip(starts, starts[1:] + [len(patch)])]
+
+
+def split_code_blocks(code: str, max_lines: int = 20) -> List[str]:
+    """빈 줄 기준 문단으로 나누고, 긴 문단은 max_lines 줄씩 자릅니다"""
+    blocks = []
+    for para in re.split(r'\n\s*\n', code or ""):
+        lines = para.strip("\n").splitlines()
+        blocks.extend("\n".join(lines[i:i + max_lines]) for i in range(0, len(lines), max_lines))
+    return [b for b in blocks if b.strip()]
+
+
+def format_feature_summary(feats: Dict, item_chars: int = 80) -> str:
+    """파일 특징 요약 (항목 하나가 길어도 요약 전체를 차지하지 않도록 항목별로 자름)"""
+    def items(values):
+        return ", ".join(v if len(v) <= item_chars else v[:item_chars] + "…" for v in values[:10])
+
+    roles = [k.replace("is_", "") for k, v in feats["hints"].items() if v]
+    return (
+        f"[FILE] {feats['file_path']}\n"
+        f"roles={roles}\n"
+        f"routes=[{items(feats['routes'])}]\n"
+        f"defs=[{items(feats['defs'])}]\n"
+        f"configs=[{items(feats['configs'])}]"
+    )
+
+
+def batch_label(position: int) -> str:
+    """묶음 prompt 안에서 요구사항을 구분하는 label (ID 가 없거나 겹치는 chunk 도 위치로 구분)"""
+    return f"R{position + 1}"
+
+
+def format_requirement(req_meta: Dict, budget: int, label: str | None = None) -> str:
+    rid = candidate_req_id(req_meta) or ""
+    head = (f"[{label}] {rid}" if label else f"[{rid or 'RFP'}]") + f" {req_meta.get('title', '')}\nSNIPPET:\n"
+    return head + truncate_to_tokens(req_meta.get("snippet", ""), budget - estimate_tokens(head))
+
+
+def select_evidence(blocks: List[Tuple[str, str]], terms: List[str], budget: int) -> List[Tuple[int, str, str]]:
+    """(종류, 본문) 블록을 요구사항 term 과의 관련도 순으로 budget 안에서 고르고, 원래 순서의 (index, 종류, 본문) 으로 돌려줍니다
+
+    관련도 = 등장한 term 수 / sqrt(토큰 수), 변경 hunk 는 실제 변경이므로 가중치 2배.
+    관련 term 이 없는 블록은 hunk → 코드 앞부분 순으로 남는 예산을 채운다.
+    """
+    term_set = set(terms)
+    scored = []
+    for idx, (kind, text) in enumerate(blocks):
+        cost = estimate_tokens(text) + 2  # 블록 구분자 포함
+        hits = len(term_set.intersection(tokenize(text)))
+        score = hits / math.sqrt(cost) * (2.0 if kind == "hunk" else 1.0)
+        scored.append((score, idx, cost))
+
+    chosen = []
+    for score, idx, cost in sorted(scored, key=lambda x: (-x[0], x[1])):
+        if cost <= budget:
+            chosen.append(idx)
+            budget -= cost
+        elif not chosen and budget > 32:
+            # 첫 블록이 통째로 안 들어가면 잘라서라도 넣는다
+            kind, text = blocks[idx]
+            blocks[idx] = (kind, truncate_to_tokens(text, budget - 2))
+            chosen.append(idx)
+            budget = 0
+    return [(i, *blocks[i]) for i in sorted(chosen)]
+
+
+def build_packed_prompt(feats: Dict, patch: str, req_metas: List[Dict], budget: int) -> str:
+    """요구사항 → 파일 특징 요약 → (관련도 순) 변경 hunk / 코드 발췌 순으로 budget 을 채운 판정 prompt"""
+    cfg = PACK_CONFIG
+    header = JUDGE_PACKED_PROMPT if len(req_metas) == 1 else JUDGE_BATCH_PROMPT
+    labels = [batch_label(i) for i in range(len(req_metas))] if len(req_metas) > 1 else [None]
+    requirements = "\n\n".join(format_requirement(m, cfg["requirement_tokens"], label)
+                                for m, label in zip(req_metas, labels))
+    summary = truncate_to_tokens(format_feature_summary(feats), cfg["summary_tokens"])
+    frame = (f"{header}\n\n=== FILE FEATURE SUMMARY ===\n{summary}\n\n=== CHANGED HUNKS ===\n\n"
+             f"=== RELEVANT CODE ===\n\n=== REQUIREMENTS ===\n{requirements}\n\nReturn JSON only.\n")
+
+    terms = list(dict.fromkeys(t for m in req_metas for t in requirement_terms(m)))
+    blocks = [("hunk", h) for h in split_hunks(patch)] + [("code", c) for c in split_code_blocks(feats["sampled"])]
+    evidence = select_evidence(blocks, terms, budget - estimate_tokens(frame))
+    hunks = "\n".join(text for _, kind, text in evidence if kind == "hunk") or "(no diff available)"
+    code, prev = "", None
+    for idx, kind, text in evidence:
+        if kind == "code":
+            # 이어지는 블록은 그대로 붙이고, 건너뛴 부분은 ... 로 표시
+            code += ("" if prev is None else "\n\n" if idx == prev + 1 else "\n...\n") + text
+            prev = idx
+
+    return (f"{header}\n\n=== FILE FEATURE SUMMARY ===\n{summary}\n\n=== CHANGED HUNKS ===\n{hunks}\n\n"
+            f"=== RELEVANT CODE ===\n{code}\n\n=== REQUIREMENTS ===\n{requirements}\n\nReturn JSON only.\n")
+
+
+def prompt_budget(n_requirements: int) -> int:
+    cfg = PACK_CONFIG
+    return int(cfg["num_ctx"] * cfg["safety"]) - cfg["output_tokens"] * n_requirements
+
+
+def group_requirements(req_metas: List[Dict]) -> List[List[Dict]]:
+    """context 에 들어가는 만큼(최대 max_requirements 개) 요구사항을 한 prompt 로 묶습니다"""
+    cfg = PACK_CONFIG
+    fixed = estimate_tokens(JUDGE_BATCH_PROMPT) + cfg["summary_tokens"] + cfg["min_evidence_tokens"]
+    groups: List[List[Dict]] = []
+    current: List[Dict] = []
+    used = fixed
+    for meta in req_metas:
+        cost = estimate_tokens(format_requirement(meta, cfg["requirement_tokens"], batch_label(len(current))))
+        fits = used + cost <= prompt_budget(len(current) + 1)
+        if current and (len(current) >= cfg["max_requirements"] or not fits):
+            groups.append(current)
+            current, used = [], fixed
+        current.append(meta)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+def pack_judge_prompts(feats: Dict, patch: str, req_metas: List[Dict]) -> List[Tuple[List[Dict], str]]:
+    """판정할 요구사항들을 (요구사항 묶음, prompt) 목록으로 만듭니다 (모든 prompt 는 토큰 예산 이내)"""
+    packed = []
+    for group in group_requirements(req_metas):
+        prompt = build_packed_prompt(feats, patch, group, prompt_budget(len(group)))
+        PACK_STATS["prompts"] += 1
+        PACK_STATS["verdicts"] += len(group)
+        PACK_STATS["prompt_tokens"] += estimate_tokens(prompt)
+        packed.append((group, prompt))
+    return packed
+
+
+def compare_prompt_tokens(commits: List[Dict], lexical_index, k: int = 5) -> Dict[str, float]:
+    """get_commit_data 결과 목록으로 기존 build_judge_input 과 packing 의 판정당 평균 prompt 토큰을 비교합니다"""
+    from rag_feature import extract_features, build_query_from_features
+    from rag_utils import build_judge_input, lexical_search_requirements
+
+    before, after, verdicts, prompts, largest = 0, 0, 0, 0, 0
+    for commit in commits:
+        for f in commit.get("files", []):
+            feats = extract_features(f["fileName"], f["code"])
+            query = build_query_from_features(feats)
+            metas = [meta for meta, _ in lexical_search_requirements(lexical_index, query, k)]
+            if not metas:
+                continue
+            before += sum(estimate_tokens(build_judge_input(query, m)) for m in metas)
+            for group in group_requirements(metas):
+                tokens = estimate_tokens(build_packed_prompt(feats, f.get("patch", ""), group, prompt_budget(len(group))))
+                after += tokens
+                largest = max(largest, tokens + PACK_CONFIG["output_tokens"] * len(group))
+                prompts += 1
+            verdicts += len(metas)
+
+    return {
+        "verdicts": verdicts,
+        "prompts_before": verdicts,
+        "prompts_after": prompts,
+        "tokens_per_verdict_before": before / verdicts if verdicts else 0.0,
+        "tokens_per_verdict_after": after / verdicts if verdicts else 0.0,
+        "max_prompt_plus_output": largest,
+        "num_ctx": PACK_CONFIG["num_ctx"],
+    }
+
+
+# 비교 : python fastapi-client/prompt_packer.py commits.jsonl (프로젝트 루트에서, 한 줄에 get_commit_data 결과 1개, LLM/임베딩 호출 없음)
+if __name__ == "__main__":
+    import json
+    import sys
+    from rag_boot import load_lexical_index
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        commit_set = [json.loads(line) for line in f if line.strip()]
+    print(json.dumps(compare_prompt_tokens(commit_set, load_lexical_index()), indent=2))
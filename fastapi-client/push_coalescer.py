@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def merge_push_payloads(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """같은 repo/branch 의 push payload 들을 하나로 합칩니다
+
+    커밋을 순서대로 따라가며 파일별 마지막 상태만 남기므로, 중간에 덮어쓰인 변경은 한 번만 분석된다.
+    """
+    first, last = payloads[0], payloads[-1]
+    commits: List[Dict[str, Any]] = []
+    for payload in payloads:
+        push_commits = payload.get('commits') or []
+        if not push_commits and payload.get('head_commit'):
+            push_commits = [payload['head_commit']]
+        commits.extend(push_commits)
+
+    files: Dict[str, str] = {}  # filename -> 최종 상태 ('added' | 'modified' | 'removed')
+    requested = 0               # 커밋 단위로 처리했다면 분석했을 파일 수
+    for commit in commits:
+        for filename in commit.get('added', []):
+            files[filename] = 'modified' if files.get(filename) in ('added', 'modified') else 'added'
+        for filename in commit.get('modified', []):
+            files[filename] = 'added' if files.get(filename) == 'added' else 'modified'
+        for filename in commit.get('removed', []):
+            files[filename] = 'removed'
+        requested += len(commit.get('added', [])) + len(commit.get('modified', []))
+
+    return {
+        'repository': last['repository'],
+        'ref': last.get('ref'),
+        'before': first.get('before'),
+        'after': last.get('after') or (last.get('head_commit') or {}).get('id'),
+        'head_commit': last.get('head_commit'),
+        'pusher': last.get('pusher'),
+        'commits': commits,
+        'files': files,
+        'push_count': len(payloads),
+        'requested_analyses': requested,
+    }
+
+
+class PushCoalescer:
+    """repo/branch 별로 push 를 window 동안 모았다가 최종 상태만 한 번에 처리하는 클래스
+
+    push 가 들어올 때마다 window 타이머가 다시 시작되며(debounce), 첫 push 후 max_wait 가 지나면 무조건 처리한다.
+    window 가 0 이하이면 push 를 모으지 않고 바로 처리한다.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 window: Optional[float] = None, max_wait: Optional[float] = None):
+        self.handler = handler
+        self.window = float(os.getenv('PUSH_COALESCE_WINDOW', '0')) if window is None else window
+        self.max_wait = self.window * 4 if max_wait is None else max_wait
+        self._pending: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._first_seen: Dict[Tuple[str, str], float] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.stats = {
+            'pushes_received': 0,
+            'batches_processed': 0,
+            'analyses_requested': 0,
+            'analyses_performed': 0,
+            'redundant_analyses_avoided': 0,
+        }
+
+    async def submit(self, payload: Dict[str, Any]) -> None:
+        """push payload 를 대기열에 추가합니다"""
+        key = (payload['repository']['full_name'], payload.get('ref') or '')
+        self.stats['pushes_received'] += 1
+        self._pending.setdefault(key, []).append(payload)
+        self._first_seen.setdefault(key, time.monotonic())
+
+        if self.window <= 0:
+            await self._flush(key)
+            return
+
+        timer = self._timers.get(key)
+        if timer:
+            timer.cancel()
+        remaining = self.max_wait - (time.monotonic() - self._first_seen[key])
+        self._timers[key] = asyncio.create_task(self._flush_later(key, max(0.0, min(self.window, remaining))))
+
+    async def _flush_later(self, key: Tuple[str, str], delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timers.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple[str, str]) -> None:
+        payloads = self._pending.pop(key, None)
+        self._first_seen.pop(key, None)
+        if not payloads:
+            return
+
+        merged = merge_push_payloads(payloads)
+        performed = sum(1 for status in merged['files'].values() if status != 'removed')
+        self.stats['batches_processed'] += 1
+        self.stats['analyses_requested'] += merged['requested_analyses']
+        self.stats['analyses_performed'] += performed
+        self.stats['redundant_analyses_avoided'] += max(0, merged['requested_analyses'] - performed)
+        print(f"[coalesce] {key[0]} {key[1]}: push {merged['push_count']}개 병합, "
+              f"파일 분석 {merged['requested_analyses']} -> {performed}")
+
+        try:
+            await self.handler(merged)
+        except Exception as e:
+            print(f"[coalesce] 병합된 push 처리 중 오류 발생: {e}")
+
+    async def flush_all(self) -> None:
+        """대기 중인 push 를 모두 즉시 처리합니다 (종료 시 사용)"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for key in list(self._pending):
+            await self._flush(key)
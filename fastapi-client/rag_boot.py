@@ -17,7 +17,12 @@ from typing import Literal
 from langgraph.graph import START, END
 from langgraph.graph import MessagesState, StateGraph
 from langchain_core.prompts import PromptTemplate
+from langchain_core.documents import Document
 from pathlib import Path
+import re
+from vector_index import NumpyVectorIndex
+from lexical_index import BM25Index
+from prompt_packer import PACK_CONFIG
 
 # model cell
 
@@ -26,14 +31,92 @@ embeddings = OllamaEmbeddings(
 )
 
 llm = ChatOllama(
-    model="qwen3:4b"
+    model="qwen3:4b",
+    num_ctx=PACK_CONFIG["num_ctx"]  # 판정 prompt 는 이 크기에 맞춰 packing 됨
 )
 
 persist_directory = "./fastapi-client/chroma_db"
 collection_name = 'requirements_list'
 
+# 요구사항 벡터 인덱스 backend : 'chroma' | 'numpy' (메모리 행렬 + 내적, VECTOR_INDEX_QUANTIZE=1 이면 int8)
+vector_backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+numpy_index_directory = "./fastapi-client/numpy_index"
+
+# 요구사항 검색 방식 : 'vector' (유사도 검색) | 'hybrid' (BM25 + 유사도 검색 결합)
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "vector").lower()
+
+# "## SFR-001: 요구사항명" 형태의 요구사항 섹션 헤더 (ID 가 없는 "## 보안 요구사항" 같은 섹션도 존재)
+SECTION_HEADER = re.compile(r'^## (.+)$', re.MULTILINE)
+REQ_HEADER = re.compile(r'^([A-Z]{3}-\d{3}):\s*(.+)$')
+
+
+def split_requirement_sections(documents):
+    """문서를 '## ' 섹션 단위로 나누고 req_id / title 메타데이터를 붙입니다 (ID 직접 조회용)"""
+    sections = []
+    for doc in documents:
+        text = doc.page_content
+        headers = list(SECTION_HEADER.finditer(text))
+        bounds = [0] + [m.start() for m in headers] + [len(text)]
+        for start, end in zip(bounds, bounds[1:]):
+            content = text[start:end].strip()
+            if not content:
+                continue
+            metadata = dict(doc.metadata)
+            m = SECTION_HEADER.match(content)
+            if m:
+                req = REQ_HEADER.match(m.group(1).strip())
+                if req:
+                    metadata.update(req_id=req.group(1), title=req.group(2).strip())
+                else:
+                    metadata.update(title=m.group(1).strip())
+            sections.append(Document(page_content=content, metadata=metadata))
+    return sections
+
+
+def load_requirement_sections():
+    # 1. 문서 로드 후 요구사항 섹션 단위로 나누기
+    loader = TextLoader("./fastapi-client/docs/RFP_requirements.md", encoding="utf-8")
+    return split_requirement_sections(loader.load())
+
+
+def load_requirement_splits():
+    # 2. 문서 나누기 (요구사항 섹션 -> chunk, chunk 는 섹션의 req_id / title 메타데이터를 물려받음)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    return text_splitter.split_documents(load_requirement_sections())
+
+
+def load_lexical_index():
+    """요구사항 섹션 전체에 대한 BM25 역색인을 생성합니다 (하이브리드 검색용, 임베딩 불필요)"""
+    index = BM25Index.from_documents(load_requirement_sections())
+    print(f"BM25 인덱스 생성 완료. ({len(index.documents)}개 섹션, {len(index.postings)}개 term)")
+    return index
+
 
 def load_or_build_vector_store():
+    if vector_backend == "numpy":
+        return load_or_build_numpy_index()
+    return load_or_build_chroma()
+
+
+def load_or_build_numpy_index():
+    quantize = os.getenv("VECTOR_INDEX_QUANTIZE", "0") == "1"
+    if NumpyVectorIndex.exists(numpy_index_directory):
+        print("Numpy 인덱스 존재. memory-map 으로 불러오기.")
+        return NumpyVectorIndex.load(embeddings, numpy_index_directory), embeddings
+
+    if os.path.exists(persist_directory) and len(os.listdir(persist_directory)) > 0:
+        # Chroma DB 가 있으면 저장된 임베딩을 그대로 옮겨서 생성 (재임베딩 없음)
+        print("Numpy 인덱스 부재. Chroma DB 임베딩으로 생성 시작.")
+        chroma_store, _ = load_or_build_chroma()
+        index = NumpyVectorIndex.from_chroma(chroma_store, numpy_index_directory, quantize=quantize)
+    else:
+        print("Numpy 인덱스 부재. 문서 임베딩으로 생성 시작.")
+        index = NumpyVectorIndex.from_documents(load_requirement_splits(), embeddings, numpy_index_directory, quantize=quantize)
+    print(f"Numpy 인덱스 생성 완료. ({len(index.documents)}개, dtype={index.vectors.dtype})")
+    return index, embeddings
+
+
+def load_or_build_chroma():
     print("[DEBUG] cwd       =", Path.cwd())
     if os.path.exists('./fastapi-client/chroma_db') and len(os.listdir('./fastapi-client/chroma_db')) > 0:
         #기존 벡터 DB 가 존재할 경우.
@@ -48,13 +131,7 @@ def load_or_build_vector_store():
         return vector_store, embeddings
     else:
         print("Vector DB 부재. 생성 시작.")
-        # 1. 문서 로드
-        loader = TextLoader("./fastapi-client/docs/RFP_requirements.md", encoding="utf-8")
-        documents = loader.load()
-
-        # 2. 문서 나누기
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        splits = text_splitter.split_documents(documents)
+        splits = load_requirement_splits()
         print(f"Chroma DB에 {len(splits)}개의 문서를 임베딩하여 저장 완료.")
 
         # 3. 벡터 스토어 생성
@@ -67,5 +144,3 @@ def load_or_build_vector_store():
         print("Vector DB 생성 완료.")
 
         return vector_store, embeddings
-
-
@@ -0,0 +1,209 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from lexical_index import tokenize, requirement_terms, candidate_req_id
+from prompt_packer import pack_judge_prompts
+from rag_utils import judge_one, judge_batch
+
+# 판정 게이트 기준값 (점수 scale 과 무관한 값)
+# - strength : 후보 점수 / 같은 파일의 1위 후보 점수 (거리 점수는 1위 거리 / 후보 거리), 1.0 = 1위
+# - evidence : 요구사항 핵심 term 중 파일 특징(경로, route, 정의, 설정, 본문)에 등장한 비율
+# - distance : 벡터 거리(제곱 L2) / 인덱스 벡터의 평균 제곱 norm, 단위 벡터 기준 2 - 2*cos (1.25 ~= cos 0.375)
+GATE_THRESHOLDS = {
+    "missing_distance": float(os.getenv("GATE_MISSING_DISTANCE", "1.25")),  # 이상 -> 순위와 무관하게 Missing
+    "missing_strength": float(os.getenv("GATE_MISSING_STRENGTH", "0.8")),   # 이하 + 근거 없음 -> Missing
+    "missing_evidence": float(os.getenv("GATE_MISSING_EVIDENCE", "0.05")),
+    "meets_margin": float(os.getenv("GATE_MEETS_MARGIN", "0.8")),           # 2위 strength 이하인 확실한 1위
+    "meets_evidence": float(os.getenv("GATE_MEETS_EVIDENCE", "0.5")),       # 이상 -> Meets
+}
+
+# (파일, 후보) 쌍의 판정 경로별 횟수
+GATE_STATS = {"pairs": 0, "gate_missing": 0, "gate_meets": 0, "llm": 0}
+
+
+def feature_terms(feats: Dict) -> Set[str]:
+    """extract_features 결과에서 비교용 term 집합을 만듭니다"""
+    text = " ".join([feats["file_path"], *feats["routes"], *feats["defs"], *feats["configs"], feats["sampled"]])
+    return set(tokenize(text))
+
+
+def lexical_evidence(req_meta: Dict, file_terms: Set[str]) -> Tuple[float, List[str]]:
+    terms = requirement_terms(req_meta)
+    if not terms:
+        return 0.0, []
+    matched = [t for t in terms if t in file_terms]
+    return len(matched) / len(terms), matched
+
+
+def embedding_scale(vector_store) -> float:
+    """인덱스에 저장된 요구사항 벡터의 평균 제곱 norm (정규화된 embedding 이면 1.0)
+
+    bge-m3 를 Ollama 로 쓰면 정규화되지 않은 벡터가 저장되므로, 거리 하한을 이 값으로 나눠 모델과 무관하게 비교한다.
+    """
+    norms = getattr(vector_store, "norms", None)
+    if norms is None:
+        embeddings = vector_store.get(include=["embeddings"])["embeddings"]
+        if embeddings is None or len(embeddings) == 0:
+            return 1.0
+        norms = np.einsum("ij,ij->i", np.asarray(embeddings, dtype=np.float32), np.asarray(embeddings, dtype=np.float32))
+    return float(np.mean(norms)) or 1.0
+
+
+def with_embedding_scale(vector_store, thresholds: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """거리 하한 비교에 쓸 embedding_scale 을 채운 게이트 기준값을 반환합니다"""
+    return dict(thresholds or GATE_THRESHOLDS, distance_scale=embedding_scale(vector_store))
+
+
+def candidate_distance(meta: Dict, score: float) -> Optional[float]:
+    """후보의 벡터 거리 원점수 (벡터 검색에 나오지 않은 lexical / ID 후보는 None)"""
+    retrieval = meta.get("retrieval", "vector")
+    if retrieval == "vector":
+        return score
+    if retrieval == "hybrid":
+        return meta.get("distance")
+    return None
+
+
+def candidate_strengths(candidates: List[Tuple[Dict, float]]) -> List[Optional[float]]:
+    """후보별 상대 강도(1위 = 1.0) 를 계산합니다. ID 직접 조회 후보는 None (항상 LLM 판정)"""
+    strengths: List[Optional[float]] = []
+    scores = [score for meta, score in candidates if meta.get("retrieval") != "id"]
+    if not scores:
+        return [None] * len(candidates)
+
+    higher_is_better = any(meta.get("retrieval") in ("lexical", "hybrid") for meta, _ in candidates)
+    best = max(scores) if higher_is_better else min(scores)
+    for meta, score in candidates:
+        if meta.get("retrieval") == "id":
+            strengths.append(None)
+        elif higher_is_better:
+            strengths.append(score / best if best > 0 else 0.0)
+        else:
+            strengths.append(best / score if score > 0 else 1.0)
+    return strengths
+
+
+def gate_decision(strength: Optional[float], runner_up: Optional[float], evidence: float,
+                  matched: List[str], thresholds: Dict[str, float],
+                  distance: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """명확한 경우 판정 결과를, 애매한 경우 None (LLM 판정 필요) 을 반환합니다"""
+    if strength is None:
+        return None
+
+    # 1위라도 거리 자체가 멀면 (파일 전체가 어느 요구사항과도 무관) 어휘 근거가 뚜렷하지 않은 한 Missing
+    if distance is not None and evidence < thresholds["meets_evidence"]:
+        relative = distance / thresholds.get("distance_scale", 1.0)
+        if relative >= thresholds["missing_distance"]:
+            return {
+                "status": "Missing", "confidence": round(min(relative / 2.0, 1.0), 3),
+                "evidence": [], "coverage": "",
+                "notes": f"gate: beyond distance floor (distance={relative:.2f})",
+            }
+    if strength <= thresholds["missing_strength"] and evidence <= thresholds["missing_evidence"]:
+        return {
+            "status": "Missing", "confidence": round(1.0 - strength, 3),
+            "evidence": [], "coverage": "",
+            "notes": f"gate: low similarity (strength={strength:.2f}) and no lexical evidence",
+        }
+    if strength >= 1.0 and (runner_up is None or runner_up <= thresholds["meets_margin"]) \
+            and evidence >= thresholds["meets_evidence"]:
+        return {
+            "status": "Meets", "confidence": round(evidence, 3),
+            "evidence": matched[:3], "coverage": "",
+            "notes": f"gate: clear top match with lexical evidence ({evidence:.0%})",
+        }
+    return None
+
+
+def plan_judgements(feats: Dict, candidates: List[Tuple[Dict, float]],
+                    thresholds: Optional[Dict[str, float]] = None) -> List[Tuple[Dict, Optional[Dict[str, Any]]]]:
+    """파일의 후보마다 (req_meta, 게이트 판정 또는 None) 을 반환합니다 (LLM 호출 없음)"""
+    thresholds = thresholds or GATE_THRESHOLDS
+    file_terms = feature_terms(feats)
+    strengths = candidate_strengths(candidates)
+    others = sorted((s for s in strengths if s is not None), reverse=True)
+    runner_up = others[1] if len(others) > 1 else None
+
+    plan = []
+    for (meta, score), strength in zip(candidates, strengths):
+        evidence, matched = lexical_evidence(meta, file_terms)
+        plan.append((meta, gate_decision(strength, runner_up, evidence, matched, thresholds,
+                                         candidate_distance(meta, score))))
+    return plan
+
+
+async def judge_candidates(llm_call, feature_query: str, feats: Dict, candidates: List[Tuple[Dict, float]],
+                           thresholds: Optional[Dict[str, float]] = None, patch: str = "") -> List[Dict[str, Any]]:
+    """게이트로 명확한 후보는 바로 판정하고, 애매한 후보만 LLM 으로 판정합니다
+
+    LLM 판정 prompt 는 토큰 예산 안에서 변경 hunk / 코드 발췌를 골라 만들고, 들어가는 만큼 요구사항을 묶는다.
+    """
+    plan = plan_judgements(feats, candidates, thresholds)
+    escalated = [meta for meta, verdict in plan if verdict is None]
+    grouped = await asyncio.gather(*(
+        judge_one(llm_call, feature_query, group[0], prompt=prompt) if len(group) == 1
+        else judge_batch(llm_call, feature_query, group, prompt, feats, patch)
+        for group, prompt in pack_judge_prompts(feats, patch, escalated)
+    ))
+    llm_verdicts = iter(verdict for group in grouped for verdict in ([group] if isinstance(group, dict) else group))
+
+    verdicts = []
+    for meta, verdict in plan:
+        GATE_STATS["pairs"] += 1
+        if verdict is None:
+            GATE_STATS["llm"] += 1
+            verdict = dict(next(llm_verdicts), decided_by="llm")
+        else:
+            GATE_STATS["gate_" + verdict["status"].lower()] += 1
+            verdict = dict(verdict, decided_by="gate",
+                           req_id=candidate_req_id(meta), req_title=meta.get("title", ""))
+        verdicts.append(verdict)
+    return verdicts
+
+
+def replay_commit_set(commits: List[Dict], vector_store, lexical_index=None, k: int = 5,
+                      thresholds: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """get_commit_data 결과 목록을 다시 돌려 게이트가 줄이는 LLM 호출 비율을 계산합니다 (LLM 호출 없음)
+
+    거리 하한의 효과를 보기 위해 하한 없이 (상대 강도만으로) 판정했을 때의 LLM 호출 수도 함께 센다.
+    """
+    from rag_feature import extract_features, build_query_from_features
+    from rag_utils import route_requirements_batch
+
+    thresholds = with_embedding_scale(vector_store, thresholds)
+    no_floor = dict(thresholds, missing_distance=float("inf"))
+    report = {"commits": len(commits), "files": 0, "pairs": 0, "gate_missing": 0, "gate_meets": 0, "llm": 0,
+              "llm_without_floor": 0, "missing_distance": thresholds["missing_distance"],
+              "distance_scale": thresholds["distance_scale"]}
+    for commit in commits:
+        feats_list = [extract_features(f["fileName"], f["code"]) for f in commit.get("files", [])]
+        queries = [build_query_from_features(feats) for feats in feats_list]
+        all_candidates = route_requirements_batch(vector_store, commit.get("message", ""), queries, k=k,
+                                                  lexical_index=lexical_index)
+        for feats, candidates in zip(feats_list, all_candidates):
+            report["files"] += 1
+            for _, verdict in plan_judgements(feats, candidates, thresholds):
+                report["pairs"] += 1
+                report["llm" if verdict is None else "gate_" + verdict["status"].lower()] += 1
+            report["llm_without_floor"] += sum(v is None for _, v in plan_judgements(feats, candidates, no_floor))
+
+    pairs = report["pairs"] or 1
+    report["llm_calls_avoided"] = (report["pairs"] - report["llm"]) / pairs
+    report["llm_calls_avoided_without_floor"] = (report["pairs"] - report["llm_without_floor"]) / pairs
+    return report
+
+
+# 리플레이 : python fastapi-client/rag_gate.py commits.jsonl (프로젝트 루트에서, 한 줄에 get_commit_data 결과 1개)
+if __name__ == "__main__":
+    import json
+    import sys
+    from rag_boot import load_or_build_vector_store, load_lexical_index, retrieval_mode
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        commit_set = [json.loads(line) for line in f if line.strip()]
+    store, _ = load_or_build_vector_store()
+    lexical = load_lexical_index() if retrieval_mode == "hybrid" else None
+    print(json.dumps(replay_commit_set(commit_set, store, lexical), indent=2))
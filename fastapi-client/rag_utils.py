@@ -1,9 +1,105 @@
 from typing import List, Tuple, Dict, Any
 from textwrap import dedent
 import json
+import os
+import re
+from lexical_index import candidate_req_id
+from prompt_packer import batch_label, pack_judge_prompts
 
-def search_requirements(vector_store, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
-    results = vector_store.similarity_search_with_score(query, k=k)
+# 커밋 메시지의 요구사항 ID 패턴. REQUIREMENT-n / REQ-n / FEAT-n / 요구사항-n 은 기능 요구사항(SFR) 번호로 간주.
+# SFR/PER/SIR/DAR 는 대문자 + '-'/'_' 만 인정 (영어 문장의 "per 5 seconds" 같은 표현이 ID 로 잡히지 않도록),
+# 별칭은 대소문자를 구분하지 않되 구분자는 필수.
+REQ_ID_PATTERN = re.compile(r'(?<![A-Za-z])(SFR|PER|SIR|DAR|(?i:REQUIREMENT|REQ|FEAT)|요구사항)[-_](\d{1,3})(?!\d)')
+REQ_ID_ALIASES = {"REQUIREMENT": "SFR", "REQ": "SFR", "FEAT": "SFR", "요구사항": "SFR"}
+# '#12' 도 SFR-012 로 보지만, GitHub issue/PR 참조와 겹치므로 접두어 있는 ID 가 하나도 없을 때만 사용하고
+# 'fixes #12', 'Merge pull request #12', '(#12)', 'owner/repo#12' 같은 참조 형태는 제외한다.
+HASH_ID_PATTERN = re.compile(r'(?:(\w+)\s+)?(?<![\w/(])#(\d{1,3})(?![\d)])')
+GITHUB_REF_KEYWORDS = {"close", "closes", "closed", "fix", "fixes", "fixed", "resolve", "resolves", "resolved", "request"}
+
+# 요구사항 검색 경로별 질의 수 (fast_path: ID 직접 조회, semantic: 유사도 검색만, lexical_only / hybrid_fused: 하이브리드 검색, 각 질의는 한 경로에만 집계)
+ROUTING_STATS = {"fast_path": 0, "semantic": 0, "fast_path_miss": 0, "lexical_only": 0, "hybrid_fused": 0}
+
+# 하이브리드 검색 : BM25 와 벡터 검색 순위를 RRF(1 / (rrf_k + rank)) 로 결합
+# lexical_shortcut 을 켜면 BM25 1위 점수가 lexical_min_score 이상이고 2위의 lexical_margin 배 이상일 때 임베딩 없이 확정
+# (min_score / margin 기본값은 파일 특징 질의 평가로 검증되지 않았으므로, 평가 전까지 기본은 꺼둠)
+HYBRID_CONFIG = {
+    "lexical_shortcut": os.getenv("HYBRID_LEXICAL_SHORTCUT", "0") == "1",
+    "lexical_min_score": float(os.getenv("HYBRID_LEXICAL_MIN_SCORE", "12.0")),
+    "lexical_margin": float(os.getenv("HYBRID_LEXICAL_MARGIN", "1.5")),
+    "rrf_k": 60,
+}
+
+
+def extract_requirement_ids(message: str) -> List[str]:
+    """커밋 메시지에서 요구사항 ID 를 'SFR-001' 형태로 정규화하여 추출합니다 (등장 순서, 중복 제거)"""
+    ids = []
+    for prefix, number in REQ_ID_PATTERN.findall(message or ""):
+        prefix = REQ_ID_ALIASES.get(prefix.upper(), prefix.upper())
+        ids.append(f"{prefix}-{int(number):03d}")
+    if not ids:
+        ids = [f"SFR-{int(number):03d}" for word, number in HASH_ID_PATTERN.findall(message or "")
+               if word.lower() not in GITHUB_REF_KEYWORDS]
+    return list(dict.fromkeys(ids))
+
+
+def lookup_requirements(vector_store, req_ids: List[str]) -> List[Tuple[Dict, float]]:
+    """요구사항 ID 로 vector store 를 메타데이터 조회합니다 (질의 임베딩 없음)
+
+    req_id 메타데이터가 없는 (이전에 생성된) 벡터 DB 는 본문에 ID 가 포함된 chunk 로 대신 찾는다.
+    """
+    where = {"req_id": req_ids[0]} if len(req_ids) == 1 else {"req_id": {"$in": req_ids}}
+    result = vector_store.get(where=where)
+    if not result.get("documents"):
+        contains = [{"$contains": rid} for rid in req_ids]
+        result = vector_store.get(where_document=contains[0] if len(contains) == 1 else {"$or": contains})
+
+    # 요구사항마다 섹션 헤더("## SFR-001:")가 있는 chunk 를 우선하여 하나로 대표
+    found: Dict[str, Dict] = {}
+    for doc, meta in zip(result.get("documents", []), result.get("metadatas", [])):
+        meta = dict(meta or {})
+        for rid in ([meta["req_id"]] if meta.get("req_id") else [r for r in req_ids if r in doc]):
+            header_at = doc.find(f"## {rid}:")
+            if rid in found and (header_at < 0 or found[rid]["_has_header"]):
+                continue
+            item = dict(meta, req_id=rid, retrieval="id", _has_header=header_at >= 0)
+            if not item.get("title"):
+                m = re.search(rf'{re.escape(rid)}:\s*(.+)', doc)
+                item["title"] = m.group(1).strip() if m else ""
+            item["snippet"] = doc[max(header_at, 0):][:400]
+            found[rid] = item
+
+    for item in found.values():
+        item.pop("_has_header")
+    return [(found[rid], 0.0) for rid in req_ids if rid in found]
+
+
+def route_requirements(vector_store, commit_message: str, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+    """커밋 메시지에 요구사항 ID 가 있으면 ID 로 직접 조회하고, 없으면 유사도 검색으로 후보를 찾습니다"""
+    return route_requirements_batch(vector_store, commit_message, [query], k=k)[0]
+
+
+def route_requirements_batch(vector_store, commit_message: str, queries: List[str], k: int = 5,
+                             lexical_index=None) -> List[List[Tuple[Dict, float]]]:
+    """한 커밋의 파일별 질의들에 대해 route_requirements 를 수행합니다 (ID 조회는 커밋당 1회)
+
+    lexical_index(BM25Index) 가 주어지면 유사도 검색 대신 하이브리드 검색을 사용한다.
+    """
+    req_ids = extract_requirement_ids(commit_message)
+    if req_ids:
+        candidates = lookup_requirements(vector_store, req_ids)
+        if candidates:
+            ROUTING_STATS["fast_path"] += len(queries)
+            return [list(candidates) for _ in queries]
+        ROUTING_STATS["fast_path_miss"] += len(queries)
+
+    if lexical_index is not None:
+        # 하이브리드 경로는 lexical_only / hybrid_fused 로 나눠 집계
+        return hybrid_search_requirements_batch(vector_store, lexical_index, queries, k=k)
+    ROUTING_STATS["semantic"] += len(queries)
+    return search_requirements_batch(vector_store, queries, k=k)
+
+
+def _to_candidates(results) -> List[Tuple[Dict, float]]:
     out = []
     for doc, score in results:
         meta = doc.metadata.copy()
@@ -11,6 +107,74 @@ def search_requirements(vector_store, query: str, k: int = 5) -> List[Tuple[Dict
         out.append((meta, float(score)))
     return out
 
+
+def search_requirements(vector_store, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+    return _to_candidates(vector_store.similarity_search_with_score(query, k=k))
+
+
+def search_requirements_batch(vector_store, queries: List[str], k: int = 5) -> List[List[Tuple[Dict, float]]]:
+    """여러 질의를 검색합니다. 배치 검색을 지원하는 인덱스(NumpyVectorIndex)는 임베딩/행렬곱을 한 번에 수행"""
+    if not queries:
+        return []
+    if hasattr(vector_store, "similarity_search_with_score_batch"):
+        return [_to_candidates(r) for r in vector_store.similarity_search_with_score_batch(queries, k=k)]
+    return [search_requirements(vector_store, q, k=k) for q in queries]
+
+def lexical_search_requirements(lexical_index, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+    out = []
+    for idx, score in lexical_index.search(query, k=k):
+        meta = dict(lexical_index.metadatas[idx])
+        meta["snippet"] = lexical_index.documents[idx][:400]
+        out.append((meta, score))
+    return out
+
+
+def _is_confident_lexical(lexical: List[Tuple[Dict, float]]) -> bool:
+    if not HYBRID_CONFIG["lexical_shortcut"] or not lexical or lexical[0][1] < HYBRID_CONFIG["lexical_min_score"]:
+        return False
+    second = lexical[1][1] if len(lexical) > 1 else 0.0
+    return lexical[0][1] >= HYBRID_CONFIG["lexical_margin"] * second
+
+
+def _fuse(lexical: List[Tuple[Dict, float]], vector: List[Tuple[Dict, float]], k: int) -> List[Tuple[Dict, float]]:
+    """BM25 / 벡터 결과를 요구사항 단위로 묶어 RRF 점수로 정렬합니다"""
+    fused: Dict[str, Dict] = {}
+    for source, results in (("bm25", lexical), ("distance", vector)):
+        for rank, (meta, score) in enumerate(results):
+            key = candidate_req_id(meta) or meta.get("snippet", "")
+            item = fused.setdefault(key, {"meta": dict(meta), "rrf": 0.0})
+            if source not in item["meta"]:
+                item["meta"][source] = score
+                item["rrf"] += 1.0 / (HYBRID_CONFIG["rrf_k"] + rank + 1)
+
+    ranked = sorted(fused.values(), key=lambda x: -x["rrf"])[:k]
+    return [(dict(item["meta"], retrieval="hybrid"), item["rrf"]) for item in ranked]
+
+
+def hybrid_search_requirements(vector_store, lexical_index, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+    return hybrid_search_requirements_batch(vector_store, lexical_index, [query], k=k)[0]
+
+
+def hybrid_search_requirements_batch(vector_store, lexical_index, queries: List[str], k: int = 5) -> List[List[Tuple[Dict, float]]]:
+    """BM25 결과와 벡터 검색 결과를 결합합니다 (lexical_shortcut 사용 시 BM25 결과가 확실한 질의는 임베딩 생략)
+
+    반환 점수는 높을수록 관련도가 높은 값(BM25 점수 또는 RRF 점수)이며, meta 의 bm25 / distance 에 원점수를 담는다.
+    """
+    lexical = [lexical_search_requirements(lexical_index, q, k=k) for q in queries]
+    pending = [i for i, result in enumerate(lexical) if not _is_confident_lexical(result)]
+    vector = dict(zip(pending, search_requirements_batch(vector_store, [queries[i] for i in pending], k=k)))
+
+    results = []
+    for i, lex in enumerate(lexical):
+        if i in vector:
+            ROUTING_STATS["hybrid_fused"] += 1
+            results.append(_fuse(lex, vector[i], k))
+        else:
+            ROUTING_STATS["lexical_only"] += 1
+            results.append([(dict(meta, bm25=score, retrieval="lexical"), score) for meta, score in lex])
+    return results
+
+
 JUDGE_PROMPT = dedent("""
 You are a strict software requirements reviewer.
 
@@ -31,7 +195,7 @@ Be conservative: If acceptance criteria (validation, error handling, tests) are
 """).strip()
 
 def build_judge_input(feature_query: str, req_meta: Dict) -> str:
-    rid = req_meta.get("req_id") or req_meta.get("source_path","RFP")
+    rid = candidate_req_id(req_meta) or "RFP"
     title = req_meta.get("title","")
     snippet = req_meta.get("snippet","")
     return f"""{JUDGE_PROMPT}
@@ -47,16 +211,204 @@ SNIPPET:
 Return JSON only.
 """
 
-async def judge_one(llm_call, feature_query: str, req_meta: Dict) -> Dict[str, Any]:
-    prompt = build_judge_input(feature_query, req_meta)
-    raw = await llm_call(prompt)
+# judge 출력 JSON schema (Ollama structured output 으로 생성 자체를 이 형태로 제한)
+JUDGE_STATUSES = ["Meets", "Partial", "Missing", "Conflict"]
+JUDGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": JUDGE_STATUSES},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "evidence": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+        "notes": {"type": "string"},
+        "coverage": {"type": "string"},
+    },
+    "required": ["status", "confidence", "evidence", "notes", "coverage"],
+}
+
+# 한 prompt 에 요구사항 여러 개를 묶어 판정할 때의 schema (요구사항별 판정 + prompt 안의 label)
+JUDGE_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdicts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"key": {"type": "string"}, **JUDGE_SCHEMA["properties"]},
+                "required": ["key", *JUDGE_SCHEMA["required"]],
+            },
+        },
+    },
+    "required": ["verdicts"],
+}
+
+REPAIR_PROMPT = dedent("""
+The following output was supposed to be a single JSON object matching this schema, but it is invalid.
+
+SCHEMA:
+{schema}
+
+OUTPUT:
+{output}
+
+Rewrite it as one valid JSON object that matches the schema. Return JSON only.
+""").strip()
+
+# judge 호출 통계 (tokens_generated: 스트림으로 받은 생성 chunk 수, parse_failures: 첫 응답 파싱 실패, repair_failures: 보정 후에도 실패)
+JUDGE_STATS = {"calls": 0, "llm_requests": 0, "tokens_generated": 0, "early_stops": 0,
+               "parse_failures": 0, "repairs": 0, "repair_failures": 0}
+
+
+class JsonObjectScanner:
+    """스트리밍 텍스트에서 첫 번째 최상위 JSON 객체가 닫히는 시점을 찾습니다 (문자열/escape 고려)"""
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> int:
+        """객체가 완성되면 text 내 닫는 괄호 다음 위치를, 아니면 -1 을 반환합니다"""
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.started:
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
+
+
+def _first_json_object(raw: str) -> Any:
+    text = re.sub(r"<think>.*?</think>", "", raw or "", flags=re.DOTALL)
+    start = text.find("{")
+    if start < 0:
+        return None
+    end = JsonObjectScanner().feed(text[start:])
+    try:
+        return json.loads(text[start:start + end] if end > 0 else text[start:])
+    except ValueError:
+        return None
+
+
+def parse_judge_output(raw: str) -> Dict[str, Any] | None:
+    """LLM 출력에서 판정 JSON 객체를 꺼냅니다 (<think> 블록 제거, 형식이 틀리면 None)"""
+    return _validate_verdict(_first_json_object(raw))
+
+
+def parse_judge_batch_output(raw: str) -> Dict[str, Dict[str, Any]]:
+    """묶음 판정 출력에서 label(key) -> 판정 을 꺼냅니다 (형식이 틀린 항목은 제외)"""
+    data = _first_json_object(raw)
+    items = data.get("verdicts") if isinstance(data, dict) else None
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        verdict = _validate_verdict(item)
+        if verdict is not None and verdict.get("key"):
+            parsed[str(verdict.pop("key")).strip("[] ")] = verdict
+    return parsed
+
+
+def _validate_verdict(data: Any) -> Dict[str, Any] | None:
+    if not isinstance(data, dict) or data.get("status") not in JUDGE_STATUSES:
+        return None
     try:
-        data = json.loads(raw)
-    except Exception:
+        data["confidence"] = float(data.get("confidence", 0.0))
+    except (TypeError, ValueError):
+        data["confidence"] = 0.0
+    return data
+
+
+def make_judge_llm_call(llm, constrained: bool = True):
+    """judge 용 llm_call 을 만듭니다
+
+    constrained=True 이면 JUDGE_SCHEMA 로 출력을 제한하고(think 비활성), 응답을 스트리밍으로 받다가
+    JSON 객체가 닫히는 즉시 생성을 중단한다. False 이면 기존처럼 제한 없이 응답 끝까지 받는다 (비교 측정용).
+    두 모드 모두 스트림으로 받아 생성된 chunk 수(Ollama 는 chunk 당 1 token)를 tokens_generated 로 세므로,
+    조기 중단으로 받지 못하는 마지막 chunk 의 eval_count 없이도 같은 기준으로 비교할 수 있다.
+    """
+    async def llm_call(prompt: str, schema: Dict[str, Any] = JUDGE_SCHEMA) -> str:
+        JUDGE_STATS["llm_requests"] += 1
+        scanner = JsonObjectScanner() if constrained else None
+        parts = []
+        stream = llm.astream(prompt, format=schema, reasoning=False) if constrained else llm.astream(prompt)
+        try:
+            async for chunk in stream:
+                if not chunk.content and not chunk.additional_kwargs.get("reasoning_content"):
+                    continue  # 마지막 done chunk 등 생성 token 이 없는 chunk
+                JUDGE_STATS["tokens_generated"] += 1
+                parts.append(chunk.content)
+                end = scanner.feed(chunk.content) if scanner else -1
+                if end >= 0:
+                    parts[-1] = chunk.content[:end]
+                    JUDGE_STATS["early_stops"] += 1
+                    break
+        finally:
+            # 객체가 완성되면 스트림을 바로 닫아 연결을 끊고 뒤따르는 공백/추가 토큰 생성을 중단
+            await stream.aclose()
+        return "".join(parts)
+
+    return llm_call
+
+
+async def judge_one(llm_call, feature_query: str, req_meta: Dict, max_repairs: int = 1,
+                    prompt: str | None = None) -> Dict[str, Any]:
+    """요구사항 1개를 판정합니다 (prompt 를 주면 build_judge_input 대신 그대로 사용)"""
+    prompt = prompt or build_judge_input(feature_query, req_meta)
+    JUDGE_STATS["calls"] += 1
+    raw = await llm_call(prompt)
+    data = parse_judge_output(raw)
+
+    if data is None:
+        JUDGE_STATS["parse_failures"] += 1
+        # 잘못된 출력만 정해진 횟수 안에서 보정 요청
+        for _ in range(max_repairs):
+            JUDGE_STATS["repairs"] += 1
+            raw = await llm_call(REPAIR_PROMPT.format(schema=json.dumps(JUDGE_SCHEMA), output=raw[:2000]))
+            data = parse_judge_output(raw)
+            if data is not None:
+                break
+
+    if data is None:
+        JUDGE_STATS["repair_failures"] += 1
         data = {
             "status":"Missing","confidence":0.0,
             "evidence":["LLM JSON parse failed"],"notes":raw[:300],"coverage":""
         }
-    data["req_id"] = req_meta.get("req_id") or req_meta.get("source_path","RFP")
+    data["req_id"] = candidate_req_id(req_meta)   # ID 를 알 수 없는 chunk 는 None (진척률 집계에서 제외)
     data["req_title"] = req_meta.get("title","")
-    return data
\ No newline at end of file
+    return data
+
+
+async def judge_batch(llm_call, feature_query: str, req_metas: List[Dict], prompt: str,
+                      feats: Dict, patch: str = "", max_repairs: int = 1) -> List[Dict[str, Any]]:
+    """요구사항 여러 개를 한 번의 LLM 호출로 판정합니다
+
+    응답에서 빠지거나 형식이 틀린 요구사항만 judge_one 으로 다시 판정한다.
+    다시 판정할 때도 같은 토큰 예산으로 만든 요구사항 1개짜리 packed prompt 를 사용한다.
+    """
+    JUDGE_STATS["calls"] += 1
+    raw = await llm_call(prompt, JUDGE_BATCH_SCHEMA)
+    parsed = parse_judge_batch_output(raw)
+    if len(parsed) < len(req_metas):
+        JUDGE_STATS["parse_failures"] += 1
+
+    verdicts = []
+    for position, meta in enumerate(req_metas):
+        # prompt 의 label(R1, R2, ...) 로 짝을 맞춤 (req_id 가 없거나 같은 chunk 끼리도 섞이지 않도록)
+        data = parsed.get(batch_label(position))
+        if data is None:
+            [(_, single_prompt)] = pack_judge_prompts(feats, patch, [meta])
+            verdicts.append(await judge_one(llm_call, feature_query, meta, max_repairs, prompt=single_prompt))
+            continue
+        verdicts.append(dict(data, req_id=candidate_req_id(meta), req_title=meta.get("title", "")))
+    return verdicts
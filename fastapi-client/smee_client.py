@@ -1,34 +1,206 @@
 import asyncio
+import json
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 
-class SmeeClientManager:
-    def __init__(self, smee_url, target_url):
+import aiohttp
+from aiohttp import web
+
+# smee 메시지에서 헤더가 아닌 필드 (나머지 key 는 소문자 HTTP 헤더)
+SMEE_NON_HEADER_KEYS = ("body", "query", "timestamp", "host")
+
+
+class SmeeRelay:
+    """smee.io 채널의 SSE 스트림을 프로세스 안에서 직접 구독하여 webhook 이벤트를 handler 로 넘기는 클래스
+
+    npx smee-client 처럼 localhost 로 다시 POST 하지 않고 handler(headers, payload) 를 바로 호출한다.
+    연결이 끊기면 지수 backoff(+jitter) 로 재연결하며, smee 가 이벤트를 받은 시각(timestamp) 기준 전달 지연을 기록한다.
+    """
+
+    def __init__(self, smee_url: str, handler: Callable[[Dict[str, str], Dict[str, Any]], Awaitable[Any]],
+                 max_backoff: float = 60.0, read_timeout: float = 120.0):
         self.smee_url = smee_url
-        self.target_url = target_url
-        self.process = None
+        self.handler = handler
+        self.max_backoff = max_backoff
+        self.read_timeout = read_timeout    # ping 도 오지 않는 시간이 이보다 길면 끊긴 연결로 보고 재연결
+        self.last_event_id: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "connected": False, "connects": 0, "reconnects": 0, "events": 0, "delivered": 0,
+            "handler_errors": 0, "lag_ms_last": None, "lag_ms_avg": None, "lag_ms_max": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
 
     async def start(self):
-        """Smee 클라이언트를 시작합니다"""
+        """SSE 구독을 시작합니다"""
+        self._task = asyncio.create_task(self._run())
+        print(f"Smee relay started: {self.smee_url}")
+
+    async def stop(self):
+        """SSE 구독을 중지합니다"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            print("Smee relay stopped")
+
+    async def _run(self):
+        backoff = 1.0
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.read_timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    headers = {"Accept": "text/event-stream"}
+                    if self.last_event_id:
+                        headers["Last-Event-ID"] = self.last_event_id
+                    async with session.get(self.smee_url, headers=headers) as response:
+                        response.raise_for_status()
+                        self.stats["connected"] = True
+                        self.stats["connects"] += 1
+                        backoff = 1.0
+                        await self._consume(response)
+                    print("Smee relay: stream closed by server")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Smee relay connection error: {type(e).__name__}: {e}")
+                finally:
+                    self.stats["connected"] = False
+
+                self.stats["reconnects"] += 1
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, self.max_backoff)
+
+    async def _consume(self, response: aiohttp.ClientResponse):
+        # readline 은 64KB 를 넘는 줄(대용량 push payload) 에서 실패하므로 직접 줄 단위로 나눔
+        # 줄바꿈은 이전 chunk 까지 찾아본 위치 이후만 검색하여 큰 한 줄도 chunk 크기에 비례하는 시간만 씀
+        buffer = bytearray()
+        scanned = 0
+        event, data_lines, event_id = "message", [], None
+        async for chunk in response.content.iter_any():
+            buffer += chunk
+            start = 0
+            while True:
+                end = buffer.find(b"\n", max(start, scanned))
+                if end < 0:
+                    break
+                line = buffer[start:end].rstrip(b"\r").decode("utf-8")
+                start = end + 1
+                if not line:
+                    if data_lines:
+                        if event_id:
+                            self.last_event_id = event_id
+                        await self._dispatch(event, "\n".join(data_lines))
+                    event, data_lines, event_id = "message", [], None
+                elif line.startswith(":"):
+                    continue
+                else:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "event":
+                        event = value
+                    elif field == "data":
+                        data_lines.append(value)
+                    elif field == "id":
+                        event_id = value
+            del buffer[:start]
+            scanned = len(buffer)
+
+    async def _dispatch(self, event: str, data: str):
+        if event != "message":  # ready / ping
+            return
+        message = json.loads(data)
+        payload = message.get("body") or {}
+        headers = {k.lower(): str(v) for k, v in message.items() if k not in SMEE_NON_HEADER_KEYS}
+        self.stats["events"] += 1
+
+        timestamp = message.get("timestamp")
+        if timestamp:
+            lag = max(0.0, time.time() * 1000 - float(timestamp))
+            n = self.stats["events"]
+            self.stats["lag_ms_last"] = round(lag, 1)
+            self.stats["lag_ms_max"] = round(max(self.stats["lag_ms_max"] or 0.0, lag), 1)
+            avg = self.stats["lag_ms_avg"] or 0.0
+            self.stats["lag_ms_avg"] = round(avg + (lag - avg) / n, 1)
+
         try:
-            cmd = ['npx', 'smee-client', '--url', self.smee_url, '--target', self.target_url]
-            self.process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            print(f"Smee client started: {' '.join(cmd)}")
-        except FileNotFoundError:
-            print("Failed to start smee client: 'npx' not found.")
-            print("Please ensure Node.js and npx are installed and in your PATH.")
+            await self.handler(headers, payload)
+            self.stats["delivered"] += 1
         except Exception as e:
-            print(f"Failed to start smee client: {str(e)}")
+            self.stats["handler_errors"] += 1
+            print(f"Smee relay handler error: {e}")
+
+
+class LocalSmeeChannel:
+    """로컬 테스트용 smee 채널 (POST /{channel} 으로 받은 webhook 을 GET /{channel} SSE 구독자에게 smee 형식으로 전달)"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 3300):
+        self.host = host
+        self.port = port
+        self._queues: Dict[str, set] = {}
+        self._next_id = 1
+        self._streams: set = set()   # 열려 있는 SSE handler task (stop 시 먼저 취소해야 cleanup 이 기다리지 않음)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/{channel}", self._subscribe)
+        app.router.add_post("/{channel}", self._publish)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
 
     async def stop(self):
-        """Smee 클라이언트를 중지합니다"""
-        if self.process and self.process.returncode is None:
-            self.process.terminate()
-            try:
-                await asyncio.wait_for(self.process.wait(), timeout=5.0)
-                print("Smee client stopped")
-            except asyncio.TimeoutError:
-                self.process.kill()
-                print("Smee client forcefully killed")
+        for task in list(self._streams):
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _subscribe(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        queue: asyncio.Queue = asyncio.Queue()
+        subscribers = self._queues.setdefault(request.match_info["channel"], set())
+        subscribers.add(queue)
+        self._streams.add(asyncio.current_task())
+        try:
+            await response.write(b"event: ready\ndata: {}\n\n")
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=30)
+                    await response.write(message)
+                except asyncio.TimeoutError:
+                    await response.write(b"event: ping\ndata: {}\n\n")
+        finally:
+            subscribers.discard(queue)
+            self._streams.discard(asyncio.current_task())
+        return response
+
+    async def _publish(self, request: web.Request) -> web.Response:
+        message = {k.lower(): v for k, v in request.headers.items()}
+        message.update(body=await request.json(), query=dict(request.query), timestamp=int(time.time() * 1000))
+        encoded = f"id: {self._next_id}\ndata: {json.dumps(message)}\n\n".encode()
+        self._next_id += 1
+        for queue in self._queues.get(request.match_info["channel"], ()):
+            queue.put_nowait(encoded)
+        return web.json_response({"status": "ok"})
+
+
+# 로컬 채널 실행 : python fastapi-client/smee_client.py [port]
+#   SMEE_URL=http://127.0.0.1:3300/test 로 서버를 실행하고 http://127.0.0.1:3300/test 로 webhook payload 를 POST
+if __name__ == "__main__":
+    import sys
+
+    async def main():
+        channel = LocalSmeeChannel(port=int(sys.argv[1]) if len(sys.argv) > 1 else 3300)
+        await channel.start()
+        print(f"Local smee channel: http://{channel.host}:{channel.port}/<channel>")
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
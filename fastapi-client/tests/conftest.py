@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# fastapi-client 의 모듈은 패키지가 아닌 평면 모듈이므로 (python fastapi-client/xxx.py 로 실행) 경로를 추가
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,106 @@
+import subprocess
+
+import pytest
+
+from git_mirror import GitMirror
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, check=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def source_repo(tmp_path, monkeypatch):
+    """두 커밋짜리 원본 repo (수정 / rename / 삭제 / 추가 / 바이너리 / 한글 / 빈 파일)"""
+    for key in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(key, "tester")
+    for key in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(key, "tester@example.com")
+
+    repo = tmp_path / "src" / "owner" / "proj"
+    repo.mkdir(parents=True)
+    git(repo, "init", "-q")
+    (repo / "app.py").write_text("def login():\n    return True\n")
+    (repo / "notes.txt").write_text("remove me\n")
+    (repo / "guide.md").write_text("".join(f"line {i}\n" for i in range(40)))
+    (repo / "logo.bin").write_bytes(b"\x89PNG\x00\x01\x02")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "SFR-001 initial")
+
+    (repo / "app.py").write_text("def login():\n    return check_password()\n")
+    (repo / "notes.txt").unlink()
+    git(repo, "mv", "guide.md", "docs.md")
+    (repo / "docs.md").write_text("".join(f"line {i}\n" for i in range(39)) + "line 39 renamed\n")
+    (repo / "logo.bin").write_bytes(b"\x89PNG\x00\x03\x04")
+    (repo / "한글.py").write_text("# 로그인 요구사항\nMESSAGE = '안녕하세요'\n", encoding="utf-8")
+    (repo / "empty.py").write_text("")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "SFR-002 rework login")
+    return repo
+
+
+@pytest.fixture
+def mirror(tmp_path, source_repo):
+    return GitMirror(str(tmp_path / "mirrors"), str(tmp_path / "src" / "{repo}"))
+
+
+def test_changed_files_pair_each_patch_with_its_file(mirror, source_repo):
+    sha = git(source_repo, "rev-parse", "HEAD")
+    mirror.ensure_commit("owner/proj", sha)
+
+    files = {f["filename"]: f for f in mirror.get_changed_files("owner/proj", sha)}
+
+    assert {name: f["status"] for name, f in files.items()} == {
+        "app.py": "modified", "notes.txt": "removed", "docs.md": "renamed",
+        "logo.bin": "modified", "한글.py": "added", "empty.py": "added",
+    }
+    assert files["docs.md"]["previous_filename"] == "guide.md"
+    assert "+    return check_password()" in files["app.py"]["patch"]
+    assert "-remove me" in files["notes.txt"]["patch"]
+    assert "+line 39 renamed" in files["docs.md"]["patch"]
+    assert "check_password" not in files["docs.md"]["patch"]
+    assert "+MESSAGE = '안녕하세요'" in files["한글.py"]["patch"]
+    assert files["logo.bin"]["patch"] == ""
+    assert files["empty.py"]["patch"] == ""
+
+
+def test_root_commit_lists_every_file_as_added(mirror, source_repo):
+    sha = git(source_repo, "rev-list", "--max-parents=0", "HEAD")
+    mirror.ensure_commit("owner/proj", sha)
+
+    files = mirror.get_changed_files("owner/proj", sha)
+
+    assert sorted(f["filename"] for f in files) == ["app.py", "guide.md", "logo.bin", "notes.txt"]
+    assert {f["status"] for f in files} == {"added"}
+    assert all(f["patch"].startswith("@@") for f in files if f["filename"] != "logo.bin")
+
+
+def test_read_blobs_keeps_request_order_and_skips_unreadable(mirror, source_repo):
+    sha = git(source_repo, "rev-parse", "HEAD")
+    mirror.ensure_commit("owner/proj", sha)
+
+    paths = ["empty.py", "logo.bin", "missing.py", "한글.py", "app.py"]
+    contents = mirror.read_blobs("owner/proj", sha, paths)
+
+    assert list(contents) == paths
+    assert contents["empty.py"] == ""
+    assert contents["logo.bin"] is None
+    assert contents["missing.py"] is None
+    assert contents["한글.py"] == "# 로그인 요구사항\nMESSAGE = '안녕하세요'\n"
+    assert contents["app.py"] == "def login():\n    return check_password()\n"
+
+
+def test_ensure_commit_fetches_only_new_commits(mirror, source_repo):
+    first = git(source_repo, "rev-parse", "HEAD")
+    mirror.ensure_commit("owner/proj", first)
+    assert mirror.mirror_path("owner/proj").exists()
+
+    (source_repo / "app.py").write_text("def login():\n    return False\n")
+    git(source_repo, "commit", "-q", "-am", "SFR-003 follow-up")
+    second = git(source_repo, "rev-parse", "HEAD")
+
+    mirror.ensure_commit("owner/proj", second)
+
+    assert mirror.get_commit_info("owner/proj", second) == {
+        "sha": second, "author": "tester", "email": "tester@example.com", "message": "SFR-003 follow-up",
+    }
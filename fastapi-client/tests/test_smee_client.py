@@ -0,0 +1,137 @@
+import asyncio
+import json
+import socket
+
+import aiohttp
+
+import smee_client
+from smee_client import LocalSmeeChannel, SmeeRelay
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.content = FakeContent(chunks)
+
+
+class RecordingChannel(LocalSmeeChannel):
+    """구독 요청의 Last-Event-ID 를 기록하는 로컬 채널"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_event_ids = []
+
+    async def _subscribe(self, request):
+        self.last_event_ids.append(request.headers.get("Last-Event-ID"))
+        return await super()._subscribe(request)
+
+
+def smee_event(event_id, body, **headers):
+    message = dict(headers, body=body, query={}, timestamp=0)
+    return f"id: {event_id}\ndata: {json.dumps(message)}\n\n".encode()
+
+
+def consume(chunks):
+    received = []
+
+    async def handler(headers, payload):
+        received.append((headers, payload))
+
+    relay = SmeeRelay("http://unused", handler)
+    asyncio.run(relay._consume(FakeResponse(chunks)))
+    return relay, received
+
+
+def test_consume_frames_events_split_at_every_byte():
+    stream = (b"event: ready\ndata: {}\n\n"
+              b": keep-alive comment\n"
+              + smee_event(1, {"ref": "refs/heads/main"}, **{"X-GitHub-Event": "push"}).replace(b"\n", b"\r\n")
+              + b"event: ping\ndata: {}\n\n"
+              + smee_event(2, {"n": 2}))
+
+    for split in range(1, len(stream)):
+        relay, received = consume([stream[:split], stream[split:]])
+        assert [payload for _, payload in received] == [{"ref": "refs/heads/main"}, {"n": 2}], split
+        assert received[0][0]["x-github-event"] == "push"
+        assert relay.last_event_id == "2"
+
+
+def test_consume_handles_lines_larger_than_a_chunk():
+    body = {"files": ["x" * 1000 for _ in range(1000)]}   # 약 1MB 한 줄
+    stream = smee_event(7, body) + smee_event(8, {"after": "small"})
+    chunks = [stream[i:i + 4096] for i in range(0, len(stream), 4096)]
+
+    relay, received = consume(chunks)
+
+    assert [payload for _, payload in received] == [body, {"after": "small"}]
+    assert relay.last_event_id == "8"
+
+
+def test_consume_joins_multiline_data_and_keeps_id_of_dispatched_events_only():
+    message = json.dumps({"body": {"a": 1}, "timestamp": 0}, indent=1)
+    stream = ("id: 3\n" + "".join(f"data: {line}\n" for line in message.split("\n")) + "\n"
+              "id: 4\n").encode()   # 4 는 data 없이 끝나 전달되지 않음
+
+    relay, received = consume([stream])
+
+    assert [payload for _, payload in received] == [{"a": 1}]
+    assert relay.last_event_id == "3"
+
+
+def test_relay_delivers_through_local_channel_and_resumes_after_restart(monkeypatch):
+    monkeypatch.setattr(smee_client.random, "uniform", lambda a, b: 0.05)   # 재연결 대기 단축
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/test"
+
+    async def scenario():
+        received = asyncio.Queue()
+
+        async def handler(headers, payload):
+            await received.put((headers, payload))
+
+        async def wait_connected(relay, connects):
+            while relay.stats["connects"] < connects:
+                await asyncio.sleep(0.01)
+
+        channel = RecordingChannel(port=port)
+        await channel.start()
+        relay = SmeeRelay(url, handler)
+        await relay.start()
+        try:
+            await asyncio.wait_for(wait_connected(relay, 1), 5)
+            big = {"commits": [{"message": "m" * 200_000}], "ref": "refs/heads/main"}
+            async with aiohttp.ClientSession() as session:
+                await session.post(url, json=big, headers={"X-GitHub-Event": "push"})
+            headers, payload = await asyncio.wait_for(received.get(), 5)
+            assert payload == big and headers["x-github-event"] == "push"
+
+            # 채널이 내려갔다 다시 올라오면 마지막 event id 로 재구독
+            await channel.stop()
+            channel = RecordingChannel(port=port)
+            await channel.start()
+            await asyncio.wait_for(wait_connected(relay, 2), 10)
+            async with aiohttp.ClientSession() as session:
+                await session.post(url, json={"after": "restart"})
+            _, payload = await asyncio.wait_for(received.get(), 5)
+            assert payload == {"after": "restart"}
+            assert channel.last_event_ids[-1] == "1"
+            assert relay.stats["reconnects"] >= 1 and relay.stats["delivered"] == 2
+        finally:
+            await relay.stop()
+            await channel.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,244 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class NumpyVectorIndex:
+    """요구사항 임베딩을 하나의 float32 (선택 시 int8 양자화) 행렬로 올려두고 내적으로 top-k 를 찾는 인덱스
+
+    Chroma 대신 쓸 수 있도록 similarity_search_with_score / get 인터페이스를 맞춘다.
+    점수는 Chroma 기본 거리(l2, 제곱 유클리드 거리, 낮을수록 유사) 를 |q|² + |v|² - 2·q·v 로 계산하여 반환한다.
+    persist_directory 의 vectors.npy 는 memory-map 으로 열어 프로세스 간 페이지 캐시를 공유한다.
+    int8 은 저장 형식(파일 크기 1/4) 으로만 쓰고, 검색은 첫 검색 때 한 번 복원한 float32 행렬로 한다
+    (프로세스마다 float32 크기의 메모리를 쓰는 대신 질의마다 행렬 전체를 변환하지 않음).
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    SCALES_FILE = "scales.npy"
+    NORMS_FILE = "norms.npy"
+    DOCS_FILE = "documents.json"
+
+    def __init__(self, embedding_function, vectors: np.ndarray, documents: List[str],
+                 metadatas: List[Dict[str, Any]], scales: Optional[np.ndarray] = None,
+                 norms: Optional[np.ndarray] = None, persist_directory: Optional[str] = None):
+        self.embedding_function = embedding_function
+        self.vectors = vectors        # (N, D) float32, 또는 int8 (scales 와 함께)
+        self.scales = scales          # (N,) float32, int8 양자화 시 행별 scale
+        self.norms = norms            # (N,) float32, 원본 벡터의 제곱 norm
+        self.documents = documents
+        self.metadatas = metadatas
+        self.persist_directory = persist_directory
+        self._matrix: Optional[np.ndarray] = None   # 검색용 float32 행렬 (int8 이면 복원본, float32 면 vectors 그대로)
+
+    # ------------------------------------------------------------------
+    # 생성 / 저장 / 로드
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_embeddings(cls, embedding_function, embeddings: Sequence[Sequence[float]], documents: List[str],
+                        metadatas: List[Dict[str, Any]], persist_directory: Optional[str] = None,
+                        quantize: bool = False) -> "NumpyVectorIndex":
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+        scales = None
+        if quantize:
+            # 행별 대칭 양자화 : v ≈ q * scale, q ∈ [-127, 127]
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            vectors = np.round(vectors / scales[:, None]).astype(np.int8)
+            scales = scales.astype(np.float32)
+
+        index = cls(embedding_function, np.ascontiguousarray(vectors), list(documents),
+                    [dict(m or {}) for m in metadatas], scales, norms, persist_directory)
+        if persist_directory:
+            index.save(persist_directory)
+        return index
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], embedding, persist_directory: Optional[str] = None,
+                       quantize: bool = False) -> "NumpyVectorIndex":
+        texts = [doc.page_content for doc in documents]
+        return cls.from_embeddings(embedding, embedding.embed_documents(texts), texts,
+                                   [doc.metadata for doc in documents], persist_directory, quantize)
+
+    @classmethod
+    def from_chroma(cls, chroma_store, persist_directory: Optional[str] = None,
+                    quantize: bool = False) -> "NumpyVectorIndex":
+        """기존 Chroma 컬렉션에 저장된 임베딩을 그대로 옮깁니다 (재임베딩 없음)"""
+        data = chroma_store.get(include=["embeddings", "documents", "metadatas"])
+        return cls.from_embeddings(chroma_store.embeddings, data["embeddings"], data["documents"],
+                                   data["metadatas"], persist_directory, quantize)
+
+    def save(self, persist_directory: str) -> None:
+        os.makedirs(persist_directory, exist_ok=True)
+        np.save(os.path.join(persist_directory, self.VECTORS_FILE), self.vectors)
+        np.save(os.path.join(persist_directory, self.NORMS_FILE), self.norms)
+        scales_path = os.path.join(persist_directory, self.SCALES_FILE)
+        if self.scales is not None:
+            np.save(scales_path, self.scales)
+        elif os.path.exists(scales_path):
+            os.remove(scales_path)
+        with open(os.path.join(persist_directory, self.DOCS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        self.persist_directory = persist_directory
+
+    @classmethod
+    def load(cls, embedding_function, persist_directory: str) -> "NumpyVectorIndex":
+        vectors = np.load(os.path.join(persist_directory, cls.VECTORS_FILE), mmap_mode="r")
+        scales_path = os.path.join(persist_directory, cls.SCALES_FILE)
+        scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        norms = np.load(os.path.join(persist_directory, cls.NORMS_FILE))
+        with open(os.path.join(persist_directory, cls.DOCS_FILE), encoding="utf-8") as f:
+            docs = json.load(f)
+        return cls(embedding_function, vectors, docs["documents"], docs["metadatas"], scales, norms, persist_directory)
+
+    @classmethod
+    def exists(cls, persist_directory: str) -> bool:
+        return os.path.exists(os.path.join(persist_directory, cls.VECTORS_FILE)) and \
+            os.path.exists(os.path.join(persist_directory, cls.DOCS_FILE))
+
+    # ------------------------------------------------------------------
+    # 검색
+    # ------------------------------------------------------------------
+    def _search_matrix(self) -> np.ndarray:
+        """검색에 쓰는 float32 (N, D) 행렬 (int8 이면 첫 호출에 scale 을 곱해 한 번만 복원)"""
+        if self._matrix is None:
+            if self.scales is None:
+                self._matrix = self.vectors
+            else:
+                self._matrix = self.vectors.astype(np.float32) * self.scales[:, None]
+        return self._matrix
+
+    def _distances(self, queries: np.ndarray) -> np.ndarray:
+        """(Q, D) 질의 행렬과 전체 벡터의 제곱 l2 거리 (Q, N)"""
+        dots = queries @ self._search_matrix().T
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        return np.maximum(q_norms[:, None] + self.norms[None, :] - 2.0 * dots, 0.0)
+
+    def similarity_search_by_vectors(self, query_vectors: Sequence[Sequence[float]],
+                                     k: int = 5) -> List[List[Tuple[Document, float]]]:
+        """여러 질의 벡터의 top-k 를 한 번의 행렬곱으로 계산합니다"""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        dists = self._distances(queries)
+        k = min(k, dists.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        results = []
+        for row, idx in zip(dists, top):
+            idx = idx[np.argsort(row[idx])]
+            results.append([
+                (Document(page_content=self.documents[i], metadata=dict(self.metadatas[i])), float(row[i]))
+                for i in idx
+            ])
+        return results
+
+    def similarity_search_with_score_batch(self, queries: List[str], k: int = 5) -> List[List[Tuple[Document, float]]]:
+        return self.similarity_search_by_vectors(self.embedding_function.embed_documents(queries), k=k)
+
+    def similarity_search_with_score(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vectors([self.embedding_function.embed_query(query)], k=k)[0]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: Sequence[float],
+                                                          k: int = 5) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vectors([embedding], k=k)[0]
+
+    def get(self, where: Optional[Dict[str, Any]] = None, where_document: Optional[Dict[str, Any]] = None,
+            **kwargs) -> Dict[str, List]:
+        """Chroma get() 의 메타데이터/본문 필터 중 lookup_requirements 가 쓰는 형태($in, $contains, $or)를 지원합니다"""
+        ids, documents, metadatas = [], [], []
+        for i, (doc, meta) in enumerate(zip(self.documents, self.metadatas)):
+            if where and not _match_where(meta, where):
+                continue
+            if where_document and not _match_document(doc, where_document):
+                continue
+            ids.append(str(i))
+            documents.append(doc)
+            metadatas.append(dict(meta))
+        return {"ids": ids, "documents": documents, "metadatas": metadatas}
+
+
+def _match_where(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    if "$and" in where:
+        return all(_match_where(meta, w) for w in where["$and"])
+    if "$or" in where:
+        return any(_match_where(meta, w) for w in where["$or"])
+    for key, cond in where.items():
+        if isinstance(cond, dict):
+            if "$in" in cond and meta.get(key) not in cond["$in"]:
+                return False
+            if "$eq" in cond and meta.get(key) != cond["$eq"]:
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+def _match_document(doc: str, where_document: Dict[str, Any]) -> bool:
+    if "$or" in where_document:
+        return any(_match_document(doc, w) for w in where_document["$or"])
+    if "$and" in where_document:
+        return all(_match_document(doc, w) for w in where_document["$and"])
+    return where_document.get("$contains", "") in doc
+
+
+def benchmark_query_latency(stores: Dict[str, Any], query_vectors: List[List[float]],
+                            k: int = 5, repeat: int = 20) -> Dict[str, Dict[str, float]]:
+    """미리 임베딩한 질의로 backend 별 검색 지연시간(ms) 을 측정합니다 (임베딩 호출 시간 제외)
+
+    first_ms 는 인덱스 생성/로드 직후 첫 검색 (int8 은 float32 복원 포함), 나머지는 이후 반복 검색 기준이다.
+    """
+    report = {}
+    for name, store in stores.items():
+        start = time.perf_counter()
+        store.similarity_search_by_vector_with_relevance_scores(query_vectors[0], k=k)
+        first_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for _ in range(repeat):
+            for vec in query_vectors:
+                start = time.perf_counter()
+                store.similarity_search_by_vector_with_relevance_scores(vec, k=k)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        batch_ms = None
+        if hasattr(store, "similarity_search_by_vectors"):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                store.similarity_search_by_vectors(query_vectors, k=k)
+            batch_ms = (time.perf_counter() - start) * 1000 / (repeat * len(query_vectors))
+
+        timings.sort()
+        report[name] = {
+            "first_ms": first_ms,
+            "mean_ms": sum(timings) / len(timings),
+            "p50_ms": timings[len(timings) // 2],
+            "p95_ms": timings[int(len(timings) * 0.95) - 1],
+            "batched_per_query_ms": batch_ms,
+            # 파일(page cache) 크기 / 프로세스별 검색 행렬 크기 (MB)
+            "stored_mb": store.vectors.nbytes / 2**20 if hasattr(store, "vectors") else None,
+            "search_mb": store._search_matrix().nbytes / 2**20 if hasattr(store, "_search_matrix") else None,
+        }
+    return report
+
+
+# 벤치마크 : python fastapi-client/vector_index.py (프로젝트 루트에서, 기존 Chroma DB 의 임베딩 사용)
+if __name__ == "__main__":
+    from rag_boot import load_or_build_chroma
+
+    chroma_store, _ = load_or_build_chroma()
+    data = chroma_store.get(include=["embeddings"])
+    # 저장된 요구사항 임베딩 자체를 질의로 사용 (Ollama 호출 없이 측정)
+    queries = [list(v) for v in data["embeddings"][:32]]
+
+    stores = {
+        "chroma": chroma_store,
+        "numpy_float32": NumpyVectorIndex.from_chroma(chroma_store),
+        "numpy_int8": NumpyVectorIndex.from_chroma(chroma_store, quantize=True),
+    }
+    for name, stats in benchmark_query_latency(stores, queries).items():
+        print(f"{name:15s} " + " ".join(f"{k}={v:.4f}" for k, v in stats.items() if v is not None))
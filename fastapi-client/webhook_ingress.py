@@ -0,0 +1,261 @@
+import hashlib
+import hmac
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import unquote_plus
+
+# push payload 앞부분에서 찾는 top-level 필드 (GitHub 은 ref, before, after, repository 순으로 보냄)
+HEAD_SCAN_BYTES = 16 * 1024
+REF_PATTERN = re.compile(rb'"ref"\s*:\s*"([^"\\]*)"')
+AFTER_PATTERN = re.compile(rb'"after"\s*:\s*"([0-9a-f]*)"')
+FULL_NAME_PATTERN = re.compile(rb'"full_name"\s*:\s*"([^"\\]*)"')
+DELETED_SHA = b"0" * 40
+
+
+def split_patterns(value: Optional[str]) -> Tuple[str, ...]:
+    """콤마로 구분된 glob 패턴 목록 (비어 있으면 전부 허용)"""
+    return tuple(p.strip() for p in (value or "").split(",") if p.strip())
+
+
+def matches_any(value: str, patterns: Tuple[str, ...]) -> bool:
+    return not patterns or any(fnmatchcase(value, p) for p in patterns)
+
+
+def sign_body(secret: str, body: bytes) -> str:
+    """X-Hub-Signature-256 헤더 값을 계산합니다"""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+@dataclass
+class IngressDecision:
+    """webhook 요청 1건의 수신 판정 결과"""
+    accepted: bool
+    status_code: int = 200
+    reason: str = ""
+    payload: Optional[Dict[str, Any]] = None
+    elapsed_us: float = 0.0
+
+    def response(self) -> Dict[str, Any]:
+        return {"status": "accepted" if self.accepted else ("ignored" if self.status_code < 400 else "rejected"),
+                "reason": self.reason}
+
+
+@dataclass
+class WebhookIngress:
+    """GitHub webhook 을 JSON 전체 decode 전에 검사하여 처리할 push 만 통과시키는 클래스
+
+    비용이 싼 단계부터 순서대로 거른다.
+      1. 헤더 : 이벤트 종류, Content-Length (check_request 는 본문을 읽기 전에 거름)
+      2. 본문 앞부분 부분 파싱 : repo, branch, 브랜치 삭제 push (정규식, 앞 HEAD_SCAN_BYTES 만 봄)
+      3. 원본 byte 에 대한 X-Hub-Signature-256 HMAC 검증
+      4. 전체 JSON decode 후 변경 파일 경로 규칙
+    무시할 요청은 서명 검증·decode 없이 바로 반환하고, 통과한 요청만 payload 를 돌려준다.
+    secret 이 비어 있으면 서명을 검증하지 않는다.
+    """
+    secret: str = field(default_factory=lambda: os.getenv("GITHUB_WEBHOOK_SECRET", ""))
+    events: Tuple[str, ...] = field(default_factory=lambda: split_patterns(os.getenv("WEBHOOK_EVENTS", "push")))
+    repos: Tuple[str, ...] = field(default_factory=lambda: split_patterns(os.getenv("WEBHOOK_REPOS")))
+    branches: Tuple[str, ...] = field(default_factory=lambda: split_patterns(os.getenv("WEBHOOK_BRANCHES")))
+    paths: Tuple[str, ...] = field(default_factory=lambda: split_patterns(os.getenv("WEBHOOK_PATHS")))
+    max_bytes: int = field(default_factory=lambda: int(os.getenv("WEBHOOK_MAX_BYTES", str(25 * 1024 * 1024))))
+    stats: Dict[str, Any] = field(default_factory=lambda: {
+        "received": 0, "accepted": 0, "ignored": 0, "rejected": 0, "reasons": {}, "avg_us": None,
+    })
+
+    async def check_request(self, request) -> IngressDecision:
+        """starlette Request 를 판정합니다 (본문을 읽기 전에 헤더로 거르고, 본문은 max_bytes 까지만 읽음)"""
+        start = time.perf_counter()
+        decision = self._check_event(request.headers) or self._check_length(request.headers.get("content-length"))
+        if decision:
+            return self._finish(decision, start)
+
+        # Content-Length 가 없는 chunked 요청도 max_bytes 를 넘는 순간 중단
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > self.max_bytes:
+                return self._finish(IngressDecision(False, 413, f"payload too large (> {self.max_bytes} bytes)"), start)
+        return self.check(request.headers, bytes(body))
+
+    def check(self, headers: Mapping[str, str], body: bytes) -> IngressDecision:
+        """HTTP 로 받은 webhook (헤더 key 는 소문자로 조회, starlette Headers 는 대소문자 무시)"""
+        start = time.perf_counter()
+        return self._finish(self._check(headers, body), start)
+
+    def check_payload(self, headers: Mapping[str, str], payload: Dict[str, Any]) -> IngressDecision:
+        """smee relay 로 받은 이미 decode 된 webhook
+
+        smee 가 본문을 다시 직렬화하므로 GitHub 이 서명한 원본 byte 가 남아 있지 않아 서명은 검증하지 않는다.
+        (이 경로의 신뢰 경계는 smee 채널 URL)
+        """
+        start = time.perf_counter()
+        decision = self._check_event(headers)
+        if decision is None:
+            repo = (payload.get("repository") or {}).get("full_name", "")
+            decision = self._check_ref(repo, payload.get("ref") or "", payload.get("after") or "")
+        if decision is None:
+            decision = self._check_paths(payload)
+        return self._finish(decision, start)
+
+    def _check(self, headers: Mapping[str, str], body: bytes) -> IngressDecision:
+        decision = self._check_event(headers)
+        if decision:
+            return decision
+        if len(body) > self.max_bytes:
+            return IngressDecision(False, 413, f"payload too large ({len(body)} bytes)")
+
+        form_encoded = body.startswith(b"payload=")
+        if not form_encoded:
+            head = body[:HEAD_SCAN_BYTES]
+            ref, after, full_name = REF_PATTERN.search(head), AFTER_PATTERN.search(head), FULL_NAME_PATTERN.search(head)
+            # 앞부분에서 찾지 못한 필드는 decode 후에 다시 확인
+            decision = self._check_ref(full_name.group(1).decode() if full_name else None,
+                                       ref.group(1).decode() if ref else None,
+                                       after.group(1).decode() if after else None)
+            if decision:
+                return decision
+
+        if self.secret and not hmac.compare_digest(sign_body(self.secret, body).encode(),
+                                                   (headers.get("x-hub-signature-256") or "").encode()):
+            return IngressDecision(False, 401, "invalid signature")
+
+        try:
+            payload = json.loads(unquote_plus(body[len(b"payload="):].decode()) if form_encoded else body)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return IngressDecision(False, 400, "invalid JSON payload")
+        if not isinstance(payload, dict):
+            return IngressDecision(False, 400, "invalid JSON payload")
+
+        repo = (payload.get("repository") or {}).get("full_name", "")
+        decision = self._check_ref(repo, payload.get("ref") or "", payload.get("after") or "")
+        return decision or self._check_paths(payload)
+
+    def _check_length(self, content_length: Optional[str]) -> Optional[IngressDecision]:
+        if content_length is None:
+            return None
+        if not content_length.isdigit():
+            return IngressDecision(False, 400, "invalid Content-Length")
+        if int(content_length) > self.max_bytes:
+            return IngressDecision(False, 413, f"payload too large ({content_length} bytes)")
+        return None
+
+    def _check_event(self, headers: Mapping[str, str]) -> Optional[IngressDecision]:
+        event = headers.get("x-github-event") or "unknown"
+        if not matches_any(event, self.events):
+            return IngressDecision(False, 200, f"event '{event}' not handled")
+        return None
+
+    def _check_ref(self, repo: Optional[str], ref: Optional[str], after: Optional[str]) -> Optional[IngressDecision]:
+        # None 은 아직 알 수 없는 값 (통과시키고 decode 후 다시 검사)
+        if repo is not None and not matches_any(repo, self.repos):
+            return IngressDecision(False, 200, f"repository '{repo}' not handled")
+        if ref is not None and self.branches:
+            if not ref.startswith("refs/heads/") or not matches_any(ref[len("refs/heads/"):], self.branches):
+                return IngressDecision(False, 200, f"ref '{ref}' not handled")
+        if after is not None and after.encode() == DELETED_SHA:
+            return IngressDecision(False, 200, "branch deleted")
+        return None
+
+    def _check_paths(self, payload: Dict[str, Any]) -> IngressDecision:
+        if "commits" not in payload and "head_commit" not in payload:
+            return IngressDecision(False, 200, "no commits in payload")
+        if self.paths:
+            commits = payload.get("commits") or ([payload["head_commit"]] if payload.get("head_commit") else [])
+            changed = (f for c in commits for key in ("added", "modified", "removed") for f in c.get(key, []))
+            if not any(matches_any(f, self.paths) for f in changed):
+                return IngressDecision(False, 200, "no changed file matches WEBHOOK_PATHS")
+        return IngressDecision(True, 200, "ok", payload)
+
+    def _finish(self, decision: IngressDecision, start: float) -> IngressDecision:
+        decision.elapsed_us = (time.perf_counter() - start) * 1e6
+        stats = self.stats
+        stats["received"] += 1
+        if decision.accepted:
+            stats["accepted"] += 1
+        else:
+            stats["ignored" if decision.status_code < 400 else "rejected"] += 1
+            key = re.sub(r" '[^']*'| \(.*\)", "", decision.reason)   # 값을 뺀 사유별 집계
+            stats["reasons"][key] = stats["reasons"].get(key, 0) + 1
+        avg = stats["avg_us"] or 0.0
+        stats["avg_us"] = round(avg + (decision.elapsed_us - avg) / stats["received"], 1)
+        return decision
+
+
+def make_push_payload(repo: str = "jaekyu-sim/ppm-test", branch: str = "main", commits: int = 1000,
+                      files_per_commit: int = 10) -> Dict[str, Any]:
+    """벤치마크용 push payload (실제 GitHub push 와 같은 key 순서)"""
+    sha = "a" * 40
+    repository = {"id": 1, "node_id": "R_1", "name": repo.split("/")[-1], "full_name": repo, "private": False,
+                  "owner": {"name": repo.split("/")[0], "login": repo.split("/")[0]},
+                  "html_url": f"https://github.com/{repo}", "description": "x" * 200, "default_branch": "main"}
+    commit_list = [{"id": f"{i:040x}", "message": f"REQ-{i % 50:03d} 기능 수정 " + "m" * 200,
+                    "timestamp": "2025-08-01T00:00:00+09:00",
+                    "author": {"name": "dev", "email": "dev@example.com", "username": "dev"},
+                    "added": [f"src/main/java/com/example/added/File{i}_{j}.java" for j in range(files_per_commit // 2)],
+                    "removed": [],
+                    "modified": [f"src/main/java/com/example/service/Service{i}_{j}.java"
+                                 for j in range(files_per_commit - files_per_commit // 2)]}
+                   for i in range(commits)]
+    return {"ref": f"refs/heads/{branch}", "before": "b" * 40, "after": sha, "repository": repository,
+            "pusher": {"name": "dev", "email": "dev@example.com"}, "sender": {"login": "dev", "id": 2},
+            "created": False, "deleted": False, "forced": False, "base_ref": None,
+            "compare": f"https://github.com/{repo}/compare/b...a",
+            "commits": commit_list, "head_commit": commit_list[-1]}
+
+
+def baseline_check(headers: Mapping[str, str], body: bytes, ingress: WebhookIngress) -> bool:
+    """비교용 : 전체 decode 후 같은 규칙으로 판정 (기존 handler 방식)"""
+    payload = json.loads(body)
+    if ingress.secret:
+        hmac.compare_digest(sign_body(ingress.secret, body), headers.get("x-hub-signature-256") or "")
+    return headers.get("x-github-event") == "push" and ingress._check_paths(payload).accepted and \
+        matches_any(payload["ref"][len("refs/heads/"):], ingress.branches)
+
+
+def benchmark_ingress(commits: int = 1000, iterations: int = 200) -> List[Dict[str, Any]]:
+    """대용량 push payload 로 요청 종류별 판정 시간을 측정합니다 (baseline : 전체 decode 후 판정)"""
+    secret = "benchmark-secret"
+    ingress = WebhookIngress(secret=secret, events=("push",), repos=("jaekyu-sim/*",), branches=("main",),
+                             paths=("src/*",), max_bytes=25 * 1024 * 1024)
+    body = json.dumps(make_push_payload(commits=commits)).encode()
+    other_branch = json.dumps(make_push_payload(branch="feature/x", commits=commits)).encode()
+    good = {"x-github-event": "push", "x-hub-signature-256": sign_body(secret, body)}
+    cases = [
+        ("accepted push", good, body),
+        ("ping event", {"x-github-event": "ping"}, body),
+        ("other branch", {"x-github-event": "push", "x-hub-signature-256": sign_body(secret, other_branch)}, other_branch),
+        ("bad signature", {"x-github-event": "push", "x-hub-signature-256": "sha256=" + "0" * 64}, body),
+    ]
+    results = []
+    for name, headers, payload_body in cases:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            decision = ingress.check(headers, payload_body)
+        ingress_us = (time.perf_counter() - start) / iterations * 1e6
+        start = time.perf_counter()
+        for _ in range(iterations):
+            baseline_check(headers, payload_body, ingress)
+        baseline_us = (time.perf_counter() - start) / iterations * 1e6
+        results.append({"case": name, "status": decision.status_code, "reason": decision.reason,
+                        "ingress_us": round(ingress_us, 1), "baseline_us": round(baseline_us, 1),
+                        "ingress_rps": int(1e6 / ingress_us), "baseline_rps": int(1e6 / baseline_us)})
+    return results
+
+
+# 벤치마크 : python fastapi-client/webhook_ingress.py [commits] [iterations]
+if __name__ == "__main__":
+    import sys
+
+    n_commits = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_iter = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    size = len(json.dumps(make_push_payload(commits=n_commits)).encode())
+    print(f"push payload : {n_commits} commits, {size / 1024 / 1024:.1f} MB, {n_iter} iterations")
+    for row in benchmark_ingress(n_commits, n_iter):
+        print(f"{row['case']:<14} -> {row['status']} {row['reason']:<36} "
+              f"ingress {row['ingress_us']:>9.1f} us ({row['ingress_rps']:>7}/s)  "
+              f"baseline {row['baseline_us']:>9.1f} us ({row['baseline_rps']:>5}/s)")
@@ -1,14 +1,28 @@
 # 가상환경 실행 : .\.venv\Scripts\activate.ps1
 
-from github import Github
-from mcp.server.fastmcp import FastMCP
+import anyio
+import argparse
 import base64
-from typing import TypedDict, List, Literal, NotRequired
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TypedDict, List, Literal, NotRequired, Optional
+
+from github import Auth, Github
+from mcp.server.fastmcp import Context, FastMCP
+
+# bare mirror 조회 코드는 fastapi-client 와 같은 모듈을 사용 (사본을 두지 않음)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "fastapi-client"))
+from git_mirror import GitMirror
 
 
 class ChangedFile(TypedDict):
     fileName: str
     code: str
+    status: NotRequired[str]
+    patch: NotRequired[str]
 
 class CommitDetails(TypedDict):
     resultStatus: Literal['success', 'error']
@@ -18,8 +32,147 @@ class CommitDetails(TypedDict):
     sha: NotRequired[str]
     files: NotRequired[List[ChangedFile]]
 
+class CommitPage(CommitDetails):
+    cursor: NotRequired[int]
+    nextCursor: NotRequired[Optional[int]]
+    totalFiles: NotRequired[int]
+
 mcp = FastMCP("ppm")
 
+# 변경 파일 내용 조회 방식 : 'rest' (파일당 get_contents 1회) | 'graphql' (여러 blob 을 쿼리 1회로 조회, 토큰 필요)
+CONTENT_BACKEND = os.getenv("GITHUB_CONTENT_BACKEND", "rest").lower()
+GRAPHQL_BATCH_SIZE = 50
+
+# 커밋 데이터 제공 방식 : 'github' (GitHub API) | 'mirror' (로컬 bare mirror 에서 diff/blob 직접 조회)
+COMMIT_DATA_BACKEND = os.getenv("COMMIT_DATA_BACKEND", "github").lower()
+git_mirror = GitMirror()
+
+# get_commit_data_page : page 당 최대 파일 수 / 최대 내용 크기(byte), 진행 알림 단위, 커밋 manifest 캐시 크기
+MAX_PAGE_SIZE = 50
+PAGE_MAX_BYTES = int(os.getenv("COMMIT_PAGE_MAX_BYTES", str(1024 * 1024)))
+PROGRESS_CHUNK = 5
+MANIFEST_CACHE_SIZE = 32
+manifest_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+manifest_lock = threading.Lock()
+
+
+def fetch_contents_rest(repo, file_paths: List[str], ref: str) -> dict:
+    """REST contents API 로 파일마다 내용을 가져옵니다 (file_path -> code)"""
+    contents = {}
+    for file_path in file_paths:
+        try:
+            content_item = repo.get_contents(file_path, ref=ref)
+
+            if content_item.encoding == "base64":
+                contents[file_path] = base64.b64decode(content_item.content).decode('utf-8')
+            else:
+                contents[file_path] = content_item.decoded_content.decode('utf-8')
+        except Exception as e:
+            print(f"Error fetching content for {file_path}: {e}")
+    return contents
+
+
+def fetch_contents_graphql(g: Github, repo, file_paths: List[str], ref: str) -> dict:
+    """GraphQL 쿼리 한 번에 GRAPHQL_BATCH_SIZE 개씩 blob text 를 가져옵니다 (file_path -> code)"""
+    owner, name = repo.full_name.split("/", 1)
+    contents = {}
+    for start in range(0, len(file_paths), GRAPHQL_BATCH_SIZE):
+        chunk = file_paths[start:start + GRAPHQL_BATCH_SIZE]
+        var_defs = ["$owner: String!", "$name: String!"]
+        fields = []
+        variables = {"owner": owner, "name": name}
+        for i, file_path in enumerate(chunk):
+            var_defs.append(f"$e{i}: String!")
+            variables[f"e{i}"] = f"{ref}:{file_path}"
+            fields.append(f"f{i}: object(expression: $e{i}) {{ ... on Blob {{ text isBinary isTruncated }} }}")
+        query = f"query({', '.join(var_defs)}) {{ repository(owner: $owner, name: $name) {{ {' '.join(fields)} }} }}"
+
+        try:
+            _, result = g.requester.graphql_query(query, variables)
+        except Exception as e:
+            print(f"GraphQL blob query failed, falling back to REST: {e}")
+            contents.update(fetch_contents_rest(repo, chunk, ref))
+            continue
+
+        repository = (result.get("data") or {}).get("repository") or {}
+        fallback = []
+        for i, file_path in enumerate(chunk):
+            blob = repository.get(f"f{i}")
+            if not blob or blob.get("isBinary"):
+                print(f"Error fetching content for {file_path}: not a text blob")
+            elif blob.get("isTruncated") or blob.get("text") is None:
+                fallback.append(file_path)
+            else:
+                contents[file_path] = blob["text"]
+        # 잘린(대용량) blob 만 REST 로 보완
+        contents.update(fetch_contents_rest(repo, fallback, ref))
+    return contents
+
+
+def load_commit_manifest(repo_name: str, commit_sha: str, file_paths: Optional[List[str]] = None) -> dict:
+    """커밋 정보와 내용을 가져올 파일 목록(targets), 변경 파일별 status/patch 를 조회합니다 (파일 내용 제외)
+
+    page 단위 조회 시 page 마다 커밋을 다시 조회하지 않도록 최근 MANIFEST_CACHE_SIZE 개를 보관한다.
+    """
+    key = (COMMIT_DATA_BACKEND, repo_name, commit_sha, tuple(file_paths) if file_paths is not None else None)
+    with manifest_lock:
+        if key in manifest_cache:
+            manifest_cache.move_to_end(key)
+            return manifest_cache[key]
+
+    if COMMIT_DATA_BACKEND == "mirror":
+        # 로컬 mirror 를 증분 fetch 한 뒤 object store 에서 커밋 정보/patch 를 읽음
+        git_mirror.ensure_commit(repo_name, commit_sha)
+        info = git_mirror.get_commit_info(repo_name, commit_sha)
+        changed = {f["filename"]: {"status": f["status"], "patch": f["patch"]}
+                   for f in git_mirror.get_changed_files(repo_name, commit_sha) if f["status"] != "removed"}
+        manifest = {"repo_name": repo_name, "author": info["author"], "email": info["email"],
+                    "message": info["message"], "sha": info["sha"], "ref": info["sha"]}
+    else:
+        token = os.getenv("GITHUB_TOKEN")
+        g = Github(auth=Auth.Token(token)) if token else Github()
+
+        repo = g.get_repo(repo_name) # TODO: 부적합한 repo_name 예외처리
+        commit = repo.get_commit(sha=commit_sha) # TODO: 부적합한 commit_sha 예외처리
+
+        # 파일 제거의 경우는 무시
+        changed = {file.filename: {"status": file.status, "patch": file.patch or ""}
+                   for file in commit.files if file.status != 'removed'}
+        manifest = {"repo_name": repo_name, "author": commit.commit.author.name, "email": commit.commit.author.email,
+                    "message": commit.commit.message, "sha": commit.sha, "ref": commit_sha,
+                    "github": g, "repo": repo, "graphql": CONTENT_BACKEND == "graphql" and bool(token)}
+
+    manifest["changed"] = changed
+    manifest["targets"] = file_paths if file_paths is not None else list(changed)
+    with manifest_lock:
+        manifest_cache[key] = manifest
+        if len(manifest_cache) > MANIFEST_CACHE_SIZE:
+            manifest_cache.popitem(last=False)
+    return manifest
+
+
+def fetch_file_contents(manifest: dict, file_paths: List[str]) -> dict:
+    """manifest 의 backend 로 파일 내용을 가져옵니다 (file_path -> code, 실패/바이너리 파일 제외)"""
+    if COMMIT_DATA_BACKEND == "mirror":
+        contents = git_mirror.read_blobs(manifest["repo_name"], manifest["sha"], file_paths)
+        return {path: code for path, code in contents.items() if code is not None}
+    if manifest["graphql"]:
+        return fetch_contents_graphql(manifest["github"], manifest["repo"], file_paths, manifest["ref"])
+    return fetch_contents_rest(manifest["repo"], file_paths, manifest["ref"])
+
+
+def build_changed_files(manifest: dict, file_paths: List[str], contents: dict) -> List[ChangedFile]:
+    files_list = []
+    for file_path in file_paths:
+        if file_path not in contents:
+            continue
+        item = {"fileName": file_path, "code": contents[file_path]}
+        if file_path in manifest["changed"]:
+            item.update(manifest["changed"][file_path])
+        files_list.append(item)
+    return files_list
+
+
 @mcp.tool()
 def add(a: int, b: int) -> int:
     """두 숫자를 더하는 함수입니다.
@@ -34,56 +187,86 @@ def add(a: int, b: int) -> int:
     return a + b
 
 @mcp.tool()
-def get_commit_data(repo_name: str, commit_sha: str) -> CommitDetails:
+async def get_commit_data(repo_name: str, commit_sha: str, file_paths: Optional[List[str]] = None) -> CommitDetails:
     """특정 GitHub 커밋에서 변경된 파일의 내용 목록을 가져옵니다.
 
     Args:
         repo_name (str): GitHub 리포지토리 이름 (예: 'owner/repo').
         commit_sha (str): 파일 변경 내용을 가져올 커밋의 SHA.
+        file_paths (Optional[List[str]]): 지정 시 커밋의 변경 파일 대신, 이 파일들의 commit_sha 시점 내용을 가져옵니다.
 
     Returns:
         CommitDetails: 커밋 정보와 변경된 파일의 상세 정보 또는 에러 메시지가 담긴 공통 응답 딕셔너리.
     """
+    # GitHub API / git 호출은 blocking 이므로 thread 에서 실행 (HTTP transport 에서 여러 세션의 요청을 동시에 처리)
+    return await anyio.to_thread.run_sync(load_commit_data, repo_name, commit_sha, file_paths)
+
+
+def load_commit_data(repo_name: str, commit_sha: str, file_paths: Optional[List[str]] = None) -> CommitDetails:
     try:
-        g = Github()
+        manifest = load_commit_manifest(repo_name, commit_sha, file_paths)
+        contents = fetch_file_contents(manifest, manifest["targets"])
 
-        repo = g.get_repo(repo_name) # TODO: 부적합한 repo_name 예외처리
-        commit = repo.get_commit(sha=commit_sha) # TODO: 부적합한 commit_sha 예외처리
-        
-        author = commit.commit.author.name
-        email = commit.commit.author.email
-        message = commit.commit.message
-        sha = commit.sha
-
-        files_list = []
-        for file in commit.files:
-            # 파일 제거의 경우는 무시
-            if file.status == 'removed':
-                continue
-            
-            file_path = file.filename
-            try:
-                content_item = repo.get_contents(file_path, ref=commit_sha)
-                
-                if content_item.encoding == "base64":
-                    code = base64.b64decode(content_item.content).decode('utf-8')
-                else:
-                    code = content_item.decoded_content.decode('utf-8')
-
-                files_list.append({
-                    "fileName": file_path,
-                    "code": code
-                })
-            except Exception as e:
-                print(f"Error fetching content for {file_path}: {e}")
+        return {
+            "resultStatus": "success",
+            "author": manifest["author"],
+            "email": manifest["email"],
+            "message": manifest["message"],
+            "sha": manifest["sha"],
+            "files": build_changed_files(manifest, manifest["targets"], contents)
+        }
+    except Exception as e:
+        print(f"An overall error occurred: {e}")
+        return {
+            "resultStatus": "error"
+        }
 
+
+@mcp.tool()
+async def get_commit_data_page(repo_name: str, commit_sha: str, cursor: int = 0, page_size: int = 10,
+                               file_paths: Optional[List[str]] = None, ctx: Context = None) -> CommitPage:
+    """get_commit_data 의 page 단위 버전입니다. 변경 파일을 cursor 부터 최대 page_size 개(및 PAGE_MAX_BYTES 이내)만 가져옵니다.
+
+    Args:
+        repo_name (str): GitHub 리포지토리 이름 (예: 'owner/repo').
+        commit_sha (str): 파일 변경 내용을 가져올 커밋의 SHA.
+        cursor (int): 가져올 첫 파일의 위치 (첫 page 는 0, 이후 응답의 nextCursor).
+        page_size (int): page 당 최대 파일 수 (최대 MAX_PAGE_SIZE).
+        file_paths (Optional[List[str]]): 지정 시 커밋의 변경 파일 대신, 이 파일들의 commit_sha 시점 내용을 가져옵니다.
+
+    Returns:
+        CommitPage: 커밋 정보, 이번 page 의 파일 목록, 다음 page 의 cursor(nextCursor, 마지막 page 면 None), 전체 파일 수.
+    """
+    try:
+        manifest = await anyio.to_thread.run_sync(load_commit_manifest, repo_name, commit_sha, file_paths)
+        targets = manifest["targets"]
+        page = targets[cursor:cursor + max(1, min(page_size, MAX_PAGE_SIZE))]
+
+        files_list: List[ChangedFile] = []
+        page_bytes, done = 0, 0
+        # PROGRESS_CHUNK 개씩 가져오며 진행 상황 알림, 누적 크기가 PAGE_MAX_BYTES 를 넘으면 page 를 일찍 마감
+        for start in range(0, len(page), PROGRESS_CHUNK):
+            chunk = page[start:start + PROGRESS_CHUNK]
+            contents = await anyio.to_thread.run_sync(fetch_file_contents, manifest, chunk)
+            files_list.extend(build_changed_files(manifest, chunk, contents))
+            done += len(chunk)
+            page_bytes += sum(len(code) for code in contents.values())
+            if ctx is not None:
+                await ctx.report_progress(cursor + done, len(targets), f"{cursor + done}/{len(targets)} files")
+            if page_bytes >= PAGE_MAX_BYTES:
+                break
+
+        next_cursor = cursor + done
         return {
             "resultStatus": "success",
-            "author": author,
-            "email": email,
-            "message": message,
-            "sha": sha,
-            "files": files_list
+            "author": manifest["author"],
+            "email": manifest["email"],
+            "message": manifest["message"],
+            "sha": manifest["sha"],
+            "files": files_list,
+            "cursor": cursor,
+            "nextCursor": next_cursor if next_cursor < len(targets) else None,
+            "totalFiles": len(targets),
         }
     except Exception as e:
         print(f"An overall error occurred: {e}")
@@ -92,6 +275,15 @@ def get_commit_data(repo_name: str, commit_sha: str) -> CommitDetails:
         }
 
 # dev : mcp dev ./fastmcp-server/mcp_server.py
-# prd : python ./fastmcp-server/mcp_server.py 
+# prd : python ./fastmcp-server/mcp_server.py                              (stdio, fastapi-client 가 subprocess 로 실행)
+#       python ./fastmcp-server/mcp_server.py --transport streamable-http  (상시 실행 HTTP 서비스, http://host:port/mcp)
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default=os.getenv("MCP_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.getenv("MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_PORT", "8765")))
+    args = parser.parse_args()
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=args.transport)